@@ -0,0 +1,80 @@
+import os
+
+# 批处理调度器配置
+BATCH_MAX_SIZE = int(os.getenv("DETECT_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("DETECT_BATCH_MAX_WAIT_MS", "5"))
+BATCH_QUEUE_SIZE = int(os.getenv("DETECT_BATCH_QUEUE_SIZE", "64"))
+
+# 推理进程池配置，0 表示在 API 进程内推理
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_THREADS_PER_WORKER = int(os.getenv("INFERENCE_THREADS_PER_WORKER", "1"))
+INFERENCE_MAX_FRAME_BYTES = int(os.getenv("INFERENCE_MAX_FRAME_BYTES", str(1920 * 1080 * 3)))
+
+# 模型注册表配置：0 表示不限制；MODEL_WARMUP 为启动时后台预加载的模型，逗号分隔
+MODEL_CACHE_MAX_MODELS = int(os.getenv("MODEL_CACHE_MAX_MODELS", "0"))
+MODEL_CACHE_MAX_MEMORY_MB = int(os.getenv("MODEL_CACHE_MAX_MEMORY_MB", "0"))
+MODEL_WARMUP = [name for name in os.getenv("MODEL_WARMUP", "").split(",") if name]
+
+# WebSocket 视频流配置：每个连接最多缓存的待处理帧数（超出时丢弃最旧的帧）与并发推理帧数
+WS_MAX_PENDING_FRAMES = int(os.getenv("WS_MAX_PENDING_FRAMES", "2"))
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "2"))
+
+# 批量检测接口同时解码/推理的图片数
+DETECT_BATCH_CONCURRENCY = int(os.getenv("DETECT_BATCH_CONCURRENCY", str(BATCH_MAX_SIZE * 2)))
+
+# 检测结果缓存：RESULT_CACHE_SIZE 为 0 时关闭；RESULT_CACHE_DB 为空时不写磁盘；
+# RESULT_CACHE_PHASH_DISTANCE >= 0 时按感知哈希复用近似重复帧的结果
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")
+RESULT_CACHE_PHASH_DISTANCE = int(os.getenv("RESULT_CACHE_PHASH_DISTANCE", "-1"))
+
+# 数据库与检测历史写入配置；检测历史支持 SQLite、PostgreSQL 和 MySQL/MariaDB
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./object_detection.db")
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") == "1"
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "2000"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+
+# 日志级别与可观测性：SERVER_TIMING_HEADER=1 时在 /detect/ 响应中附带 Server-Timing 头
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "0") == "1"
+
+# 分块推理（/detect/?tiled=true）：块边长（原图像素）、相邻块重叠比例、是否同时做整图推理并融合结果，
+# 以及单张图片允许的最大块数
+TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_FULL_IMAGE = os.getenv("TILE_FULL_IMAGE", "1") == "1"
+TILE_MAX_TILES = int(os.getenv("TILE_MAX_TILES", "400"))
+
+# 推理后端：INFERENCE_BACKEND 为默认后端（opencv / onnxruntime），INFERENCE_PRECISION 为默认精度
+# （fp32 / fp16 / int8，fp16/int8 使用模型的量化版本；仅 opencv 可在没有 fp16 版本时以 FP16 目标运行
+# FP32 文件，onnxruntime 缺少对应版本时加载失败）；MODEL_BACKENDS 按模型覆盖，
+# 例如 "YOLOv8=onnxruntime:int8,SSD=opencv"。线程数为 0 时使用后端默认值；使用推理进程池时
+# 每个进程的层内线程数由 INFERENCE_THREADS_PER_WORKER 决定
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "opencv")
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")
+MODEL_BACKENDS = {
+    name.strip(): tuple((setting.strip() + ":" + INFERENCE_PRECISION).split(":")[:2])
+    for name, setting in (item.split("=", 1) for item in os.getenv("MODEL_BACKENDS", "").split(",") if "=" in item)
+}
+INFERENCE_INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", "0"))
+INFERENCE_INTER_OP_THREADS = int(os.getenv("INFERENCE_INTER_OP_THREADS", "0"))
+
+# 视频流运动门控：开启后（WS_MOTION_GATE=1 或连接参数 motion_gate=true）画面静止时复用上次检测结果。
+# 缩略图中灰度变化超过 MOTION_PIXEL_DELTA 的像素比例低于 MOTION_MIN_CHANGED 视为静止；
+# 每 MOTION_KEYFRAME_INTERVAL 帧至少推理一次
+WS_MOTION_GATE = os.getenv("WS_MOTION_GATE", "0") == "1"
+MOTION_PIXEL_DELTA = int(os.getenv("MOTION_PIXEL_DELTA", "25"))
+MOTION_MIN_CHANGED = float(os.getenv("MOTION_MIN_CHANGED", "0.005"))
+MOTION_KEYFRAME_INTERVAL = int(os.getenv("MOTION_KEYFRAME_INTERVAL", "30"))
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+
+# 多路摄像头接入：CAMERA_SOURCES 为启动时注册的视频源，格式 "名称=源"（设备号、视频文件或 RTSP 地址），逗号分隔；
+# CAMERA_MAX_IN_FLIGHT 为所有摄像头同时推理的帧数上限，0 表示取批大小 × 推理进程数
+CAMERA_SOURCES = [
+    tuple(item.split("=", 1)) for item in os.getenv("CAMERA_SOURCES", "").split(",") if "=" in item
+]
+CAMERA_DEFAULT_MODEL = os.getenv("CAMERA_DEFAULT_MODEL", "SSD")
+CAMERA_DEFAULT_FPS = float(os.getenv("CAMERA_DEFAULT_FPS", "5"))
+CAMERA_MAX_IN_FLIGHT = int(os.getenv("CAMERA_MAX_IN_FLIGHT", "0"))
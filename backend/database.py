@@ -0,0 +1,102 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, UniqueConstraint, event, inspect
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine
+from backend import config
+
+Base = declarative_base()
+
+class UserSetting(Base):
+    __tablename__ = 'user_settings'
+    id = Column(Integer, primary_key=True, index=True)
+    confidence_threshold = Column(Float, default=0.5)
+    model_name = Column(String, default="SSD")
+
+class DetectionHistory(Base):
+    __tablename__ = 'detection_history'
+    id = Column(Integer, primary_key=True, index=True)
+    timestamp = Column(DateTime, index=True)
+    model_name = Column(String)
+    object_name = Column(String)
+    confidence = Column(Float)
+    image_path = Column(String)
+
+    __table_args__ = (
+        Index('ix_detection_history_object_name_timestamp', 'object_name', 'timestamp'),
+    )
+
+class ClassStatistic(Base):
+    __tablename__ = 'class_statistics'
+    id = Column(Integer, primary_key=True, index=True)
+    class_name = Column(String, unique=True)
+    count = Column(Integer)
+
+class ClassStatisticRollup(Base):
+    """Per-class detection counts pre-aggregated into minute/hour/day buckets."""
+    __tablename__ = 'class_statistic_rollups'
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    class_name = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint('granularity', 'bucket_start', 'class_name', name='uq_rollup_bucket_class'),
+        Index('ix_rollup_granularity_class_bucket', 'granularity', 'class_name', 'bucket_start'),
+    )
+
+# 汇总粒度及对应的时间截断方式
+ROLLUP_GRANULARITIES = {
+    'minute': lambda ts: ts.replace(second=0, microsecond=0),
+    'hour': lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    'day': lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0)
+}
+
+# 与 SQLAlchemy 在 SQLite 中存储 DateTime 的格式一致
+ROLLUP_SQLITE_FORMATS = {
+    'minute': '%Y-%m-%d %H:%M:00.000000',
+    'hour': '%Y-%m-%d %H:00:00.000000',
+    'day': '%Y-%m-%d 00:00:00.000000'
+}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL 模式下读写互不阻塞，批量写入时 synchronous=NORMAL 已足够安全
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def migrate_legacy_tables(engine):
+    """Move aside a detection_history table left over from the old (time, objects, count) schema."""
+    columns = {column['name'] for column in inspect(engine).get_columns('detection_history')} \
+        if inspect(engine).has_table('detection_history') else set()
+    if columns and 'object_name' not in columns:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE detection_history RENAME TO detection_history_legacy")
+            for index in ('ix_detection_history_id', 'ix_detection_history_time'):
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+
+engine = create_engine(config.DATABASE_URL)
+if engine.dialect.name == 'sqlite':
+    event.listen(engine, 'connect', set_sqlite_pragmas)
+migrate_legacy_tables(engine)
+Base.metadata.create_all(bind=engine)
+
+def backfill_rollups(engine):
+    """Build the rollup table from detection_history rows written before it existed."""
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM class_statistic_rollups LIMIT 1").first() is not None:
+            return
+        for granularity, fmt in ROLLUP_SQLITE_FORMATS.items():
+            conn.exec_driver_sql(
+                "INSERT INTO class_statistic_rollups (granularity, bucket_start, class_name, count, confidence_sum) "
+                "SELECT ?, strftime(?, timestamp) AS bucket, object_name, COUNT(*), SUM(confidence) "
+                "FROM detection_history WHERE timestamp IS NOT NULL GROUP BY bucket, object_name",
+                (granularity, fmt)
+            )
+
+backfill_rollups(engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -1,13 +1,27 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from backend.routers import detection
+from backend.routers import detection, stream, history, metrics, cameras
+from backend import config
 import uvicorn
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=config.LOG_LEVEL)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    detection.startup()
+    cameras.startup()
+    yield
+    await cameras.shutdown()
+    await detection.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(detection.router)
+app.include_router(stream.router)
+app.include_router(history.router)
+app.include_router(metrics.router)
+app.include_router(cameras.router)
 
 @app.get("/")
 def read_root():
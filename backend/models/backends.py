@@ -0,0 +1,80 @@
+import cv2
+
+# 推理后端：同一模型文件可由 OpenCV DNN 或 ONNX Runtime 执行（后者为可选依赖，仅在选用时导入）
+BACKENDS = ("opencv", "onnxruntime")
+
+
+class OpenCVBackend:
+    """Runs a net through ``cv2.dnn`` on the CPU.
+
+    OpenCV parallelizes inside each layer with a process-wide thread pool, so
+    ``intra_op_threads`` goes to ``cv2.setNumThreads``; there is no separate
+    inter-op setting. ``fp16`` selects the half-precision CPU target, which
+    only helps on CPUs with native FP16 arithmetic.
+    """
+
+    name = "opencv"
+    # ONNX exports with a static batch dimension of 1 reject larger blobs
+    # with a cv2.error, which the model answers by falling back to single frames.
+    forward_errors = (cv2.error,)
+
+    def __init__(self, weights, config=None, intra_op_threads=0, inter_op_threads=0, fp16=False):
+        if intra_op_threads:
+            cv2.setNumThreads(intra_op_threads)
+        self.net = cv2.dnn.readNet(weights, config) if config else cv2.dnn.readNet(weights)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU_FP16 if fp16 else cv2.dnn.DNN_TARGET_CPU)
+        self.output_names = self.net.getUnconnectedOutLayersNames()
+        self.supports_batching = True
+
+    def forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward(self.output_names)[0]
+
+
+class OnnxRuntimeBackend:
+    """Runs an ONNX model through an ONNX Runtime CPU session.
+
+    Quantized (QDQ/QLinear INT8) and FP16 exports load like any other ONNX
+    file. Models whose input has a fixed batch size of 1 are reported as not
+    supporting batching, so the model runs them one frame per call.
+    """
+
+    name = "onnxruntime"
+    forward_errors = ()
+
+    def __init__(self, weights, config=None, intra_op_threads=0, inter_op_threads=0, fp16=False):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("The onnxruntime backend needs the onnxruntime package (pip install onnxruntime)")
+        if config or not weights.endswith(".onnx"):
+            raise ValueError(f"onnxruntime can only run ONNX models, not {weights}")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        self.session = onnxruntime.InferenceSession(weights, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Half-precision exports take float16 input; everything else float32.
+        self.input_dtype = "float16" if model_input.type == "tensor(float16)" else None
+        self.supports_batching = model_input.shape[0] != 1
+
+    def forward(self, blob):
+        if self.input_dtype is not None:
+            blob = blob.astype(self.input_dtype)
+        output = self.session.run(None, {self.input_name: blob})[0]
+        return output.astype("float32", copy=False)
+
+
+def create_backend(name, weights, config=None, intra_op_threads=0, inter_op_threads=0, fp16=False):
+    if name == "opencv":
+        backend_class = OpenCVBackend
+    elif name == "onnxruntime":
+        backend_class = OnnxRuntimeBackend
+    else:
+        raise ValueError(f"Unknown inference backend {name!r}, expected one of {list(BACKENDS)}")
+    return backend_class(weights, config, intra_op_threads, inter_op_threads, fp16)
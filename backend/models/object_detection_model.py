@@ -1,109 +1,339 @@
+import time
+
+import os
+
 import cv2
 import numpy as np
 
+from backend.models.backends import create_backend
+
+SSD_CLASS_NAMES = {
+    0: "background", 1: "aeroplane", 2: "bicycle", 3: "bird", 4: "boat",
+    5: "bottle", 6: "bus", 7: "car", 8: "cat", 9: "chair", 10: "cow",
+    11: "diningtable", 12: "dog", 13: "horse", 14: "motorbike", 15: "person",
+    16: "pottedplant", 17: "sheep", 18: "sofa", 19: "train", 20: "tvmonitor"
+}
+
+COCO_CLASS_NAMES = {
+    0: "person", 1: "bicycle", 2: "car", 3: "motorbike", 4: "aeroplane",
+    5: "bus", 6: "train", 7: "truck", 8: "boat", 9: "traffic light",
+    10: "fire hydrant", 11: "stop sign", 12: "parking meter", 13: "bench",
+    14: "bird", 15: "cat", 16: "dog", 17: "horse", 18: "sheep", 19: "cow",
+    20: "elephant", 21: "bear", 22: "zebra", 23: "giraffe", 24: "backpack",
+    25: "umbrella", 26: "handbag", 27: "tie", 28: "suitcase", 29: "frisbee",
+    30: "skis", 31: "snowboard", 32: "sports ball", 33: "kite", 34: "baseball bat",
+    35: "baseball glove", 36: "skateboard", 37: "surfboard", 38: "tennis racket",
+    39: "bottle", 40: "wine glass", 41: "cup", 42: "fork", 43: "knife", 44: "spoon",
+    45: "bowl", 46: "banana", 47: "apple", 48: "sandwich", 49: "orange", 50: "broccoli",
+    51: "carrot", 52: "hot dog", 53: "pizza", 54: "donut", 55: "cake", 56: "chair",
+    57: "sofa", 58: "pottedplant", 59: "bed", 60: "diningtable", 61: "toilet",
+    62: "tvmonitor", 63: "laptop", 64: "mouse", 65: "remote", 66: "keyboard", 67: "cell phone",
+    68: "microwave", 69: "oven", 70: "toaster", 71: "sink", 72: "refrigerator",
+    73: "book", 74: "clock", 75: "vase", 76: "scissors", 77: "teddy bear", 78: "hair drier",
+    79: "toothbrush"
+}
+
+# 模型注册表：新增模型只需添加一项
+# family 决定预处理与输出解码方式；config 仅 Caffe 等需要单独网络结构文件的格式使用；
+# variants 为量化后的同一模型（fp16/int8），按配置的 precision 选用
+MODEL_SPECS = {
+    "SSD": {
+        "family": "ssd",
+        "weights": "backend/models/MobileNetSSD_deploy.caffemodel",
+        "config": "backend/models/MobileNetSSD_deploy.prototxt",
+        "class_names": SSD_CLASS_NAMES
+    },
+    "YOLOv5": {
+        "family": "yolov5",
+        "weights": "backend/models/yolov5s.onnx",
+        "variants": {"fp16": "backend/models/yolov5s-fp16.onnx", "int8": "backend/models/yolov5s-int8.onnx"},
+        "class_names": COCO_CLASS_NAMES
+    },
+    "YOLOv8": {
+        "family": "yolov8",
+        "weights": "backend/models/yolov8s.onnx",
+        "variants": {"fp16": "backend/models/yolov8s-fp16.onnx", "int8": "backend/models/yolov8s-int8.onnx"},
+        "class_names": COCO_CLASS_NAMES
+    }
+}
+
+PRECISIONS = ("fp32", "fp16", "int8")
+
+
+# 各模型族的输入预处理：网络输入尺寸 (width, height)，像素按 (x - mean) * scale 归一化。
+# YOLO 按训练时的方式等比缩放并用灰色 (114) 填充（letterbox）；MobileNet-SSD 训练时直接拉伸到 300x300
+PREPROCESSING = {
+    "ssd": {"input_size": (300, 300), "scale": 0.007843, "mean": 127.5, "swap_rb": False, "letterbox": False},
+    "yolov5": {"input_size": (640, 640), "scale": 1 / 255.0, "mean": 0.0, "swap_rb": True,
+               "letterbox": True, "pad_value": 114},
+    "yolov8": {"input_size": (640, 640), "scale": 1 / 255.0, "mean": 0.0, "swap_rb": True,
+               "letterbox": True, "pad_value": 114}
+}
+
+
+def preprocessing_of(model_name):
+    return PREPROCESSING[MODEL_SPECS[model_name]["family"]]
+
+
+def fit_to_input(img_width, img_height, input_size, letterbox=False):
+    """Work out how a frame is placed into the network input.
+
+    Returns ``(transform, (resized_width, resized_height))``. ``transform`` is
+    ``(scale_x, scale_y, pad_x, pad_y)``: a point at ``x`` in the frame lands
+    at ``x * scale_x + pad_x`` in the input. The scales are taken from the
+    rounded resized size, so projecting boxes back is exact.
+    """
+    input_width, input_height = input_size
+    if not letterbox:
+        return (input_width / img_width, input_height / img_height, 0, 0), input_size
+    ratio = min(input_width / img_width, input_height / img_height)
+    resized_width = min(input_width, max(1, round(img_width * ratio)))
+    resized_height = min(input_height, max(1, round(img_height * ratio)))
+    pad_x = (input_width - resized_width) // 2
+    pad_y = (input_height - resized_height) // 2
+    transform = (resized_width / img_width, resized_height / img_height, pad_x, pad_y)
+    return transform, (resized_width, resized_height)
+
+
+def project_boxes(boxes, transform):
+    """Map xyxy boxes from network input pixels back onto the original frame."""
+    scale_x, scale_y, pad_x, pad_y = transform
+    return (boxes - np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)) \
+        / np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+
+
+def register_model(model_name, family, weights, class_names, config=None, variants=None):
+    MODEL_SPECS[model_name] = {
+        "family": family,
+        "weights": weights,
+        "config": config,
+        "variants": variants or {},
+        "class_names": class_names
+    }
+
+
+def weights_for(model_name, precision="fp32", backend="opencv"):
+    """Path of the weights file for ``model_name`` at ``precision`` on ``backend``.
+
+    Under OpenCV, FP16 falls back to the FP32 file when there is no separate
+    export, since OpenCV can still run it on its FP16 target. ONNX Runtime
+    runs whatever precision the file has, so it needs a real FP16 export, and
+    INT8 always needs a quantized export.
+    """
+    spec = MODEL_SPECS[model_name]
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {list(PRECISIONS)}")
+    if precision == "fp32":
+        return spec["weights"]
+    path = spec.get("variants", {}).get(precision)
+    if path is not None and os.path.exists(path):
+        return path
+    if precision == "fp16" and backend == "opencv":
+        return spec["weights"]
+    raise FileNotFoundError(f"No {precision} variant of {model_name} found (expected {path})")
+
+
 class ObjectDetectionModel:
-    def __init__(self, model_name="SSD"):
+    def __init__(self, model_name="SSD", score_threshold=0.5, nms_threshold=0.45,
+                 backend="opencv", precision="fp32", intra_op_threads=0, inter_op_threads=0):
         self.model_name = model_name
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.backend_name = backend
+        self.precision = precision
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self._blob = None
         self.load_model()
 
     def load_model(self):
-        if self.model_name == "SSD":
-            self.net = cv2.dnn.readNetFromCaffe(
-                "backend/models/MobileNetSSD_deploy.prototxt",
-                "backend/models/MobileNetSSD_deploy.caffemodel"
-            )
-            self.class_names = {
-                0: "background", 1: "aeroplane", 2: "bicycle", 3: "bird", 4: "boat",
-                5: "bottle", 6: "bus", 7: "car", 8: "cat", 9: "chair", 10: "cow",
-                11: "diningtable", 12: "dog", 13: "horse", 14: "motorbike", 15: "person",
-                16: "pottedplant", 17: "sheep", 18: "sofa", 19: "train", 20: "tvmonitor"
-            }
-
-        elif self.model_name == "YOLOv5":
-            self.net = cv2.dnn.readNet("backend/models/yolov5s.onnx")
-            self.class_names = {
-                0: "person", 1: "bicycle", 2: "car", 3: "motorbike", 4: "aeroplane",
-                5: "bus", 6: "train", 7: "truck", 8: "boat", 9: "traffic light",
-                10: "fire hydrant", 11: "stop sign", 12: "parking meter", 13: "bench",
-                14: "bird", 15: "cat", 16: "dog", 17: "horse", 18: "sheep", 19: "cow",
-                20: "elephant", 21: "bear", 22: "zebra", 23: "giraffe", 24: "backpack",
-                25: "umbrella", 26: "handbag", 27: "tie", 28: "suitcase", 29: "frisbee",
-                30: "skis", 31: "snowboard", 32: "sports ball", 33: "kite", 34: "baseball bat",
-                35: "baseball glove", 36: "skateboard", 37: "surfboard", 38: "tennis racket",
-                39: "bottle", 40: "wine glass", 41: "cup", 42: "fork", 43: "knife", 44: "spoon",
-                45: "bowl", 46: "banana", 47: "apple", 48: "sandwich", 49: "orange", 50: "broccoli",
-                51: "carrot", 52: "hot dog", 53: "pizza", 54: "donut", 55: "cake", 56: "chair",
-                57: "sofa", 58: "pottedplant", 59: "bed", 60: "diningtable", 61: "toilet",
-                62: "tvmonitor", 63: "laptop", 64: "mouse", 65: "remote", 66: "keyboard", 67: "cell phone",
-                68: "microwave", 69: "oven", 70: "toaster", 71: "sink", 72: "refrigerator",
-                73: "book", 74: "clock", 75: "vase", 76: "scissors", 77: "teddy bear", 78: "hair drier",
-                79: "toothbrush"
-            }
-
-        elif self.model_name == "YOLOv8":
-            self.net = cv2.dnn.readNet("backend/models/yolov8s.onnx")
-            self.class_names = {
-                0: "person", 1: "bicycle", 2: "car", 3: "motorbike", 4: "aeroplane",
-                5: "bus", 6: "train", 7: "truck", 8: "boat", 9: "traffic light",
-                10: "fire hydrant", 11: "stop sign", 12: "parking meter", 13: "bench",
-                14: "bird", 15: "cat", 16: "dog", 17: "horse", 18: "sheep", 19: "cow",
-                20: "elephant", 21: "bear", 22: "zebra", 23: "giraffe", 24: "backpack",
-                25: "umbrella", 26: "handbag", 27: "tie", 28: "suitcase", 29: "frisbee",
-                30: "skis", 31: "snowboard", 32: "sports ball", 33: "kite", 34: "baseball bat",
-                35: "baseball glove", 36: "skateboard", 37: "surfboard", 38: "tennis racket",
-                39: "bottle", 40: "wine glass", 41: "cup", 42: "fork", 43: "knife", 44: "spoon",
-                45: "bowl", 46: "banana", 47: "apple", 48: "sandwich", 49: "orange", 50: "broccoli",
-                51: "carrot", 52: "hot dog", 53: "pizza", 54: "donut", 55: "cake", 56: "chair",
-                57: "sofa", 58: "pottedplant", 59: "bed", 60: "diningtable", 61: "toilet",
-                62: "tvmonitor", 63: "laptop", 64: "mouse", 65: "remote", 66: "keyboard", 67: "cell phone",
-                68: "microwave", 69: "oven", 70: "toaster", 71: "sink", 72: "refrigerator",
-                73: "book", 74: "clock", 75: "vase", 76: "scissors", 77: "teddy bear", 78: "hair drier",
-                79: "toothbrush"
-            }
+        spec = MODEL_SPECS[self.model_name]
+        self.family = spec["family"]
+        self.class_names = spec["class_names"]
+        self.preprocessing = PREPROCESSING[self.family]
+        self.input_size = self.preprocessing["input_size"]
+        self.letterbox = self.preprocessing["letterbox"]
+        width, height = self.input_size
+        self._resized = np.empty((height, width, 3), dtype=np.uint8)
+        self._planes = [np.empty((height, width), dtype=np.uint8) for _ in range(3)]
+        self.backend = create_backend(
+            self.backend_name,
+            weights_for(self.model_name, self.precision, self.backend_name),
+            spec.get("config"),
+            intra_op_threads=self.intra_op_threads,
+            inter_op_threads=self.inter_op_threads,
+            fp16=self.precision == "fp16"
+        )
+        self.supports_batching = self.backend.supports_batching
 
     def detect_objects(self, frame):
-        if self.model_name == "SSD":
-            blob = cv2.dnn.blobFromImage(frame, 0.007843, (300, 300), 127.5)
-            self.net.setInput(blob)
-            detections = self.net.forward()
-            h, w = frame.shape[:2]
-            boxes = []
-            confidences = []
-            class_ids = []
-
-            for i in range(detections.shape[2]):
-                confidence = detections[0, 0, i, 2]
-                if confidence > 0.5:
-                    idx = int(detections[0, 0, i, 1])
-                    box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                    (startX, startY, endX, endY) = box.astype("int")
-                    boxes.append([startX, startY, endX, endY])
-                    confidences.append(float(confidence))
-                    class_ids.append(idx)
-
-            return boxes, confidences, class_ids
-
-        elif self.model_name == "YOLOv5" or self.model_name == "YOLOv8":
-            blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, (640, 640), swapRB=True, crop=False)
-            self.net.setInput(blob)
-            layer_outputs = self.net.forward(self.net.getUnconnectedOutLayersNames())
-            boxes = []
-            confidences = []
-            class_ids = []
-            h, w = frame.shape[:2]
-
-            for output in layer_outputs:
-                for detection in output:
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
-                    if confidence > 0.5:
-                        box = detection[0:4] * np.array([w, h, w, h])
-                        (centerX, centerY, width, height) = box.astype("int")
-                        x = int(centerX - (width / 2))
-                        y = int(centerY - (height / 2))
-                        boxes.append([x, y, int(width), int(height)])
-                        confidences.append(float(confidence))
-                        class_ids.append(class_id)
-
-            return boxes, confidences, class_ids
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, timings=None):
+        """Run one forward pass over several frames and decode each separately.
+
+        If ``timings`` is a dict, the seconds spent in preprocess, forward and
+        postprocess are added to it.
+        """
+        if len(frames) > 1 and not self.supports_batching:
+            return [result for frame in frames for result in self.detect_batch([frame], timings)]
+        start = time.perf_counter()
+        blob, transforms = self.preprocess(frames)
+        preprocessed = time.perf_counter()
+        try:
+            output = self.forward(blob)
+        except self.backend.forward_errors:
+            # ONNX exports with a static batch dimension of 1 reject larger
+            # blobs; remember that and fall back to one frame per pass.
+            if len(frames) == 1:
+                raise
+            self.supports_batching = False
+            return self.detect_batch(frames, timings)
+        forwarded = time.perf_counter()
+        results = self.postprocess(output, transforms)
+        if timings is not None:
+            timings["preprocess"] = timings.get("preprocess", 0.0) + preprocessed - start
+            timings["forward"] = timings.get("forward", 0.0) + forwarded - preprocessed
+            timings["postprocess"] = timings.get("postprocess", 0.0) + time.perf_counter() - forwarded
+        return results
+
+    def preprocess(self, frames):
+        """Resize, pad and normalize ``frames`` into a reused NCHW float32 blob.
+
+        Each frame is resized straight into its place in the input (stretched,
+        or letterboxed for YOLO), split into planes and scaled into the blob in
+        one pass per channel; only the padding strips are filled separately.
+        Nothing is allocated per frame once the buffers have grown to the
+        batch size. The blob is overwritten by the next call; like the net
+        itself, a model must not be used from two threads at once.
+
+        Returns ``(blob, transforms)`` with one ``fit_to_input`` transform per frame.
+        """
+        width, height = self.input_size
+        if self._blob is None or len(self._blob) < len(frames):
+            self._blob = np.empty((len(frames), 3, height, width), dtype=np.float32)
+        blob = self._blob[:len(frames)]
+        scale = self.preprocessing["scale"]
+        offset = -self.preprocessing["mean"] * scale
+        pad_value = self.preprocessing.get("pad_value", 0) * scale + offset
+        channels = (2, 1, 0) if self.preprocessing["swap_rb"] else (0, 1, 2)
+        transforms = []
+        for i, frame in enumerate(frames):
+            transform, (resized_width, resized_height) = fit_to_input(
+                frame.shape[1], frame.shape[0], self.input_size, self.letterbox
+            )
+            transforms.append(transform)
+            pad_x, pad_y = transform[2:]
+            resized = cv2.resize(frame, (resized_width, resized_height),
+                                 dst=self._resized[:resized_height, :resized_width])
+            planes = [plane[:resized_height, :resized_width] for plane in self._planes]
+            cv2.split(resized, planes)
+            for c, source in enumerate(channels):
+                cv2.addWeighted(planes[source], scale, planes[source], 0, offset,
+                                dst=blob[i, c, pad_y:pad_y + resized_height, pad_x:pad_x + resized_width],
+                                dtype=cv2.CV_32F)
+            if resized_height < height:
+                blob[i, :, :pad_y] = pad_value
+                blob[i, :, pad_y + resized_height:] = pad_value
+            if resized_width < width:
+                blob[i, :, :, :pad_x] = pad_value
+                blob[i, :, :, pad_x + resized_width:] = pad_value
+        return blob, transforms
+
+    def forward(self, blob):
+        return self.backend.forward(blob)
+
+    def postprocess(self, output, transforms):
+        """Decode a batched network output given each frame's ``fit_to_input`` transform."""
+        if self.family == "ssd":
+            detections = output.reshape(-1, 7)
+            # Caffe's DetectionOutput layer flattens the batch and tags each
+            # row with the index of the image it belongs to.
+            return [
+                decode_ssd_output(detections[detections[:, 0] == i], transform, self.input_size,
+                                  self.score_threshold)
+                for i, transform in enumerate(transforms)
+            ]
+
+        return [
+            decode_yolo_output(
+                output[i], transform,
+                has_objectness=self.family == "yolov5",
+                score_threshold=self.score_threshold,
+                nms_threshold=self.nms_threshold
+            )
+            for i, transform in enumerate(transforms)
+        ]
+
+
+def empty_detections():
+    return (np.empty((0, 4), dtype=np.int32),
+            np.empty((0,), dtype=np.float32),
+            np.empty((0,), dtype=np.int32))
+
+
+def decode_ssd_output(detections, transform, input_size=(300, 300), score_threshold=0.5):
+    """Decode Caffe SSD (image_id, class_id, score, x1, y1, x2, y2) rows into xyxy frame pixels.
+
+    SSD boxes are normalized to the network input, so they are scaled to
+    input pixels first and then projected back through ``transform``.
+    """
+    rows = detections.reshape(-1, 7)
+    rows = rows[rows[:, 2] > score_threshold]
+    if len(rows) == 0:
+        return empty_detections()
+
+    input_width, input_height = input_size
+    boxes = rows[:, 3:7] * np.array([input_width, input_height, input_width, input_height], dtype=np.float32)
+    boxes = np.rint(project_boxes(boxes, transform)).astype(np.int32)
+    return boxes, rows[:, 2].astype(np.float32), rows[:, 1].astype(np.int32)
+
+
+def decode_yolo_output(output, transform, has_objectness=True,
+                       score_threshold=0.5, nms_threshold=0.45):
+    """Decode a raw YOLO head into xyxy frame pixels with class-aware NMS.
+
+    YOLOv5 exports rows of (cx, cy, w, h, objectness, class scores...) shaped
+    (1, 25200, 85); YOLOv8 drops the objectness column and is transposed to
+    (1, 84, 8400). Both give boxes in network input pixels, which are
+    projected back onto the frame through ``transform`` after NMS. Everything
+    is done on whole arrays, so the cost is dominated by the threshold mask
+    rather than by the number of candidate rows.
+    """
+    predictions = output.reshape(output.shape[-2:]) if output.ndim == 3 else output
+    num_attrs = 4 + (1 if has_objectness else 0)
+    if not has_objectness and predictions.shape[0] < predictions.shape[1]:
+        # Threshold on the (84, 8400) layout first: the column-wise max is
+        # contiguous, and only the few surviving candidates get transposed.
+        predictions = predictions[:, predictions[num_attrs:].max(axis=0) > score_threshold].T
+
+    if has_objectness:
+        # Most anchors are background, so drop them before touching class scores.
+        predictions = predictions[predictions[:, 4] > score_threshold]
+        class_scores = predictions[:, num_attrs:] * predictions[:, 4:5]
+    else:
+        class_scores = predictions[:, num_attrs:]
+    if len(predictions) == 0:
+        return empty_detections()
+
+    class_ids = class_scores.argmax(axis=1)
+    confidences = class_scores[np.arange(len(class_ids)), class_ids]
+    keep = confidences > score_threshold
+    if not keep.any():
+        return empty_detections()
+
+    centers = predictions[keep, 0:2]
+    sizes = predictions[keep, 2:4]
+    confidences = confidences[keep].astype(np.float32)
+    class_ids = class_ids[keep].astype(np.int32)
+    top_left = centers - sizes / 2
+
+    indices = cv2.dnn.NMSBoxesBatched(
+        np.hstack((top_left, sizes)), confidences, class_ids, score_threshold, nms_threshold
+    )
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+    top_left = top_left[indices]
+    boxes = np.hstack((top_left, top_left + sizes[indices]))
+    boxes = np.rint(project_boxes(boxes, transform)).astype(np.int32)
+    return boxes, confidences[indices], class_ids[indices]
@@ -0,0 +1,173 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from backend.routers.detection import (
+    registry, select_model_name, format_detections, detect_frame, record_history, observe_request, status_of
+)
+from backend.services.batching import QueueFullError, SchedulerClosedError
+from backend.services.cameras import CameraScheduler
+from backend.services.motion import MotionGate, IoUTracker
+from backend import config
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class CameraConfig(BaseModel):
+    source: str
+    model_name: str = config.CAMERA_DEFAULT_MODEL
+    target_fps: float = config.CAMERA_DEFAULT_FPS
+    priority: float = 1.0
+    loop: bool = True
+    motion_gate: bool = False
+    stream_id: Optional[str] = None
+
+
+async def detect_camera_frame(stream, frame):
+    started = time.perf_counter()
+    timings = {}
+    model_name = stream.model_name
+    status = 500
+    try:
+        if stream.gate is not None:
+            thumbnail = await run_in_threadpool(stream.gate.thumbnail_bgr, frame)
+            infer = stream.gate.should_infer(thumbnail)
+            last = stream.last_detections
+            if not infer and last is not None and last[0] == model_name:
+                stream.stats["skipped"] += 1
+                status = 200
+                return {"model_name": model_name, "inferred": False, "age": stream.gate.skipped, "detections": last[1]}
+
+        async with registry.use(model_name) as scheduler:
+            try:
+                boxes, confidences, class_ids, img_width, img_height = await detect_frame(scheduler, frame, timings)
+            except (QueueFullError, SchedulerClosedError) as e:
+                # 调度器队列已满（或已停止）时丢弃这一帧，下一次调度会取最新帧
+                stream.stats["rejected"] += 1
+                status = status_of(e)
+                return None
+        serialize_started = time.perf_counter()
+        detections = format_detections(scheduler.model, boxes, confidences, class_ids, img_width, img_height)
+        record_history(scheduler.model, class_ids, confidences, f"camera:{stream.stream_id}")
+        if stream.tracker is not None:
+            for detection, track_id in zip(detections, stream.tracker.update(boxes, class_ids)):
+                detection["track_id"] = int(track_id)
+            stream.last_detections = (model_name, detections)
+        timings["serialize"] = time.perf_counter() - serialize_started
+        stream.stats["inferred"] += 1
+        status = 200
+        return {"model_name": model_name, "inferred": True, "age": 0, "detections": detections}
+    finally:
+        observe_request("camera", model_name, status, started, timings)
+
+
+# 所有摄像头共享推理能力，默认上限为一批的大小乘以推理进程数
+cameras = CameraScheduler(
+    detect_camera_frame,
+    max_in_flight=config.CAMERA_MAX_IN_FLIGHT or config.BATCH_MAX_SIZE * max(1, config.INFERENCE_WORKERS)
+)
+
+
+def add_camera(camera):
+    try:
+        stream = cameras.add(
+            camera.source,
+            select_model_name(camera.model_name),
+            target_fps=camera.target_fps,
+            priority=camera.priority,
+            loop_video=camera.loop,
+            stream_id=camera.stream_id
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=str(e.args[0]))
+    if camera.motion_gate:
+        stream.gate = MotionGate(
+            pixel_delta=config.MOTION_PIXEL_DELTA,
+            min_changed=config.MOTION_MIN_CHANGED,
+            keyframe_interval=config.MOTION_KEYFRAME_INTERVAL
+        )
+        stream.tracker = IoUTracker(config.TRACK_IOU_THRESHOLD)
+    return stream
+
+
+def startup():
+    cameras.start()
+    for stream_id, source in config.CAMERA_SOURCES:
+        add_camera(CameraConfig(source=source, stream_id=stream_id))
+
+
+async def shutdown():
+    await cameras.stop()
+
+
+# 摄像头的增删查都在事件循环上执行（均不阻塞），不能放进线程池，
+# 否则会与调度循环并发修改 cameras.streams
+def get_stream(stream_id):
+    stream = cameras.streams.get(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail=f"Unknown camera {stream_id}")
+    return stream
+
+
+@router.post("/cameras")
+async def register_camera(camera: CameraConfig):
+    """Start capturing from a device index, video file or stream URL and detect on it continuously."""
+    return add_camera(camera).snapshot()
+
+
+@router.get("/cameras")
+async def list_cameras():
+    return {"cameras": [stream.snapshot() for stream in cameras.streams.values()]}
+
+
+@router.get("/cameras/{stream_id}")
+async def read_camera(stream_id: str):
+    stream = get_stream(stream_id)
+    return {**stream.snapshot(), "latest": stream.latest}
+
+
+@router.delete("/cameras/{stream_id}")
+async def remove_camera(stream_id: str):
+    get_stream(stream_id)
+    return cameras.remove(stream_id).snapshot()
+
+
+@router.websocket("/ws/cameras/{stream_id}")
+async def watch_camera(websocket: WebSocket, stream_id: str):
+    """Push every result published for a camera; slow clients only get the newest one."""
+    stream = cameras.streams.get(stream_id)
+    if stream is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    results = asyncio.Queue(maxsize=1)
+    if stream.latest is not None:
+        results.put_nowait(stream.latest)
+    stream.subscribers.add(results)
+
+    async def send_results():
+        while True:
+            await websocket.send_text(json.dumps(await results.get()))
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(send_results()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.error("Camera subscription failed", exc_info=error)
+    finally:
+        stream.subscribers.discard(results)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,71 +1,527 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query
-from backend.models.object_detection_model import ObjectDetectionModel
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Header, Request
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from backend.models.object_detection_model import ObjectDetectionModel, MODEL_SPECS
+from backend.services.batching import BatchScheduler, QueueFullError, SchedulerClosedError
+from backend.services.worker_pool import InferenceWorkerPool
+from backend.services.model_registry import ModelRegistry, estimate_model_bytes
+from backend.services.result_cache import ResultCache, perceptual_hash
+from backend.services.history_writer import HistoryWriter
+from backend.database import engine
+from backend.services.metrics import (
+    REQUESTS, REQUEST_LATENCY, MODEL_LOAD_SECONDS, MODEL_EVENTS, observe_stages, server_timing
+)
+from backend.services.ingest import InvalidImageError, decode_image, raw_frame, scale_boxes
+from backend.services.encoding import DETECTIONS_MEDIA_TYPE, accepts_packed, clip_boxes, pack_detections
+from backend.services.tiling import tile_grid, cut_by_tile_edge, merge_detections
+from backend.services.archive import is_image_name, list_archive_images, read_archive_member
+from backend import config
 import numpy as np
-import cv2
-import traceback
+import asyncio
+import io
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# 初始化模型
-ssd_model = ObjectDetectionModel(model_name='SSD')
-yolov5_model = ObjectDetectionModel(model_name='YOLOv5')
-yolov8_model = ObjectDetectionModel(model_name='YOLOv8')
-
-def convert_to_standard_types(obj):
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, np.generic):
-        return obj.item()
-    elif isinstance(obj, dict):
-        return {k: convert_to_standard_types(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_to_standard_types(i) for i in obj]
+# 请求级阶段；preprocess/forward/postprocess 由调度器按批次统计
+REQUEST_STAGES = ("read", "decode", "queue", "serialize")
+
+def backend_for(model_name):
+    """The ``(backend, precision)`` configured for ``model_name``."""
+    return config.MODEL_BACKENDS.get(model_name, (config.INFERENCE_BACKEND, config.INFERENCE_PRECISION))
+
+def create_model(model_name):
+    backend, precision = backend_for(model_name)
+    if config.INFERENCE_WORKERS > 0:
+        return InferenceWorkerPool(
+            model_name,
+            num_workers=config.INFERENCE_WORKERS,
+            threads_per_worker=config.INFERENCE_THREADS_PER_WORKER,
+            max_batch_size=config.BATCH_MAX_SIZE,
+            max_frame_bytes=config.INFERENCE_MAX_FRAME_BYTES,
+            backend=backend,
+            precision=precision,
+            inter_op_threads=config.INFERENCE_INTER_OP_THREADS
+        )
+    return ObjectDetectionModel(
+        model_name=model_name,
+        backend=backend,
+        precision=precision,
+        intra_op_threads=config.INFERENCE_INTRA_OP_THREADS,
+        inter_op_threads=config.INFERENCE_INTER_OP_THREADS
+    )
+
+def create_scheduler(model_name):
+    model = create_model(model_name)
+    return BatchScheduler(
+        model,
+        max_batch_size=config.BATCH_MAX_SIZE,
+        max_wait_ms=config.BATCH_MAX_WAIT_MS,
+        max_queue_size=config.BATCH_QUEUE_SIZE,
+        concurrency=getattr(model, 'num_workers', 1)
+    )
+
+async def close_scheduler(scheduler):
+    await scheduler.stop()
+    if isinstance(scheduler.model, InferenceWorkerPool):
+        scheduler.model.close()
+
+def observe_registry_event(record):
+    MODEL_EVENTS.inc(record["model_name"], record["event"])
+    if record["event"] == "load":
+        MODEL_LOAD_SECONDS.set(record["model_name"], value=record["seconds"])
+
+def scheduler_bytes(model_name):
+    # 每个工作进程各自持有一份网络
+    return estimate_model_bytes(model_name, backend_for(model_name)[1]) * max(1, config.INFERENCE_WORKERS)
+
+# 模型在首次请求时加载，按最近最少使用策略淘汰
+registry = ModelRegistry(
+    create_scheduler,
+    close_scheduler,
+    sizer=scheduler_bytes,
+    max_models=config.MODEL_CACHE_MAX_MODELS,
+    max_memory_bytes=config.MODEL_CACHE_MAX_MEMORY_MB * 1024 * 1024
+)
+registry.listeners.append(observe_registry_event)
+
+# 检测结果缓存
+result_cache = None
+if config.RESULT_CACHE_SIZE > 0:
+    result_cache = ResultCache(
+        max_entries=config.RESULT_CACHE_SIZE,
+        ttl_seconds=config.RESULT_CACHE_TTL,
+        db_path=config.RESULT_CACHE_DB or None,
+        phash_distance=config.RESULT_CACHE_PHASH_DISTANCE
+    )
+
+# 检测历史在后台线程中批量写入数据库
+history_writer = None
+if config.HISTORY_ENABLED:
+    history_writer = HistoryWriter(
+        engine,
+        max_queue_size=config.HISTORY_QUEUE_SIZE,
+        batch_size=config.HISTORY_BATCH_SIZE,
+        flush_interval=config.HISTORY_FLUSH_INTERVAL
+    )
+
+def record_history(model, class_ids, confidences, image_path=None):
+    if history_writer is not None:
+        history_writer.record(model.model_name, model.class_names, class_ids, confidences, image_path)
+
+def startup():
+    # 进程池必须在应用启动后创建，不能在导入时创建
+    registry.warmup(config.MODEL_WARMUP)
+    if history_writer is not None:
+        history_writer.start()
+
+async def shutdown():
+    await registry.close()
+    if history_writer is not None:
+        await run_in_threadpool(history_writer.stop)
+
+def select_model_name(model_name):
+    # 未知模型回退到 SSD
+    return model_name if model_name in MODEL_SPECS else 'SSD'
+
+def format_detections(model, boxes, confidences, class_ids, img_width, img_height):
+    # 整体裁剪并一次性转换为 Python 类型，避免逐框转换 numpy 标量
+    boxes = clip_boxes(boxes, img_width, img_height).tolist()
+    class_names = model.class_names
+    return [
+        {"box": box, "confidence": confidence, "class_id": class_id, "class_name": class_names[class_id]}
+        for box, confidence, class_id in zip(
+            boxes, np.asarray(confidences, dtype=np.float64).tolist(), np.asarray(class_ids).tolist()
+        )
+    ]
+
+def detections_response(model, boxes, confidences, class_ids, img_width, img_height, accept, image_path=None):
+    """Serialize detections as JSON, or packed when ``accept`` asks for it; records history either way."""
+    record_history(model, class_ids, confidences, image_path)
+    if not accepts_packed(accept):
+        response = JSONResponse({"detections": format_detections(
+            model, boxes, confidences, class_ids, img_width, img_height
+        )})
     else:
-        return obj
+        response = Response(
+            pack_detections(boxes, confidences, class_ids, img_width, img_height),
+            media_type=DETECTIONS_MEDIA_TYPE,
+            headers={"X-Model-Name": model.model_name}
+        )
+    response.headers["Vary"] = "Accept"
+    return response
+
+def decode_upload(content, preprocessing, with_phash=False):
+    img, size = decode_image(content, preprocessing)
+    return img, size, perceptual_hash(img) if with_phash else None
+
+def status_of(error):
+    if isinstance(error, InvalidImageError):
+        return 400
+    if isinstance(error, (QueueFullError, SchedulerClosedError)):
+        return 503
+    return 500
+
+def observe_request(endpoint, model_name, status, started, timings):
+    REQUESTS.inc(endpoint, model_name, status)
+    REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, model_name)
+    # 模型内部各阶段已由调度器按批次统计，这里只记录请求级阶段
+    observe_stages(model_name, {stage: timings[stage] for stage in REQUEST_STAGES if stage in timings})
+
+async def detect_content(scheduler, content, timings=None):
+    """Decode and detect an encoded image, serving repeats from the result cache.
+
+    Returns ``(boxes, confidences, class_ids, img_width, img_height)``. If
+    ``timings`` is a dict, per-stage durations are recorded into it.
+    """
+    model = scheduler.model
+    cache = result_cache
+    key = None
+    if cache is not None:
+        key = cache.make_key(content, model.model_name, model.score_threshold, model.nms_threshold)
+        result = cache.get(key)
+        if result is None and cache.has_disk:
+            result = await run_in_threadpool(cache.get_from_disk, key)
+        if result is not None:
+            return result
+
+    decode_started = time.perf_counter()
+    img, (img_width, img_height), phash = await run_in_threadpool(
+        decode_upload, content, model.preprocessing, cache is not None and cache.uses_phash
+    )
+    if timings is not None:
+        timings["decode"] = time.perf_counter() - decode_started
+    if phash is not None:
+        result = cache.get_similar(key, phash, img_width, img_height)
+        if result is not None:
+            return result
+
+    boxes, confidences, class_ids = await scheduler.submit(img, timings)
+    # 大图按缩小后的分辨率解码，框需映射回原图坐标
+    boxes = scale_boxes(boxes, img.shape[1::-1], (img_width, img_height))
+    result = (boxes, confidences, class_ids, img_width, img_height)
+    if cache is not None:
+        cache.record_miss()
+        if cache.has_disk:
+            await run_in_threadpool(cache.put, key, result, phash)
+        else:
+            cache.put(key, result, phash)
+    return result
+
+def decode_full(content):
+    # 分块推理需要原始分辨率，不能缩小解码
+    img, _ = decode_image(content)
+    return img
+
+async def detect_tiled(scheduler, content, tile_size, overlap, full_image, timings=None):
+    """Detect small objects in a large image by running overlapping tiles.
+
+    All tiles (plus the whole image when ``full_image`` is set) are submitted
+    together so they share batched forward passes; tile boxes are shifted to
+    image coordinates and duplicates along tile seams are merged.
+    """
+    model = scheduler.model
+    cache = result_cache
+    key = None
+    if cache is not None:
+        key = cache.make_key(content, model.model_name, model.score_threshold, model.nms_threshold,
+                             "tiled", tile_size, overlap, full_image)
+        result = cache.get(key)
+        if result is None and cache.has_disk:
+            result = await run_in_threadpool(cache.get_from_disk, key)
+        if result is not None:
+            return result
 
-def clip_box_values(box, img_width, img_height):
-    """Clip the box values to be within the image dimensions."""
-    x1, y1, x2, y2 = box
-    x1 = max(0, x1)
-    y1 = max(0, y1)
-    x2 = min(img_width, x2)
-    y2 = min(img_height, y2)
-    return [x1, y1, x2, y2]
+    decode_started = time.perf_counter()
+    img = await run_in_threadpool(decode_full, content)
+    if timings is not None:
+        timings["decode"] = time.perf_counter() - decode_started
+    img_height, img_width = img.shape[:2]
+    tiles = tile_grid(img_width, img_height, tile_size, overlap)
+    if len(tiles) > config.TILE_MAX_TILES:
+        raise InvalidImageError(f"Image would need {len(tiles)} tiles, more than {config.TILE_MAX_TILES}; "
+                          f"use a larger tile_size")
+    frames = [img[y:y + height, x:x + width] for x, y, width, height in tiles]
+    if full_image and len(tiles) > 1:
+        frames.append(img)
+
+    results = await scheduler.submit_many(frames, timings)
+
+    boxes, confidences, class_ids, cut = [], [], [], []
+    for i, (tile_boxes, tile_confidences, tile_class_ids) in enumerate(results):
+        if i < len(tiles):
+            x, y = tiles[i][:2]
+            cut.append(cut_by_tile_edge(tile_boxes, tiles[i], img_width, img_height))
+            tile_boxes = tile_boxes + np.array([x, y, x, y], dtype=np.int32)
+        else:
+            cut.append(np.zeros(len(tile_boxes), dtype=bool))
+        boxes.append(tile_boxes)
+        confidences.append(tile_confidences)
+        class_ids.append(tile_class_ids)
+    boxes, confidences = np.concatenate(boxes), np.concatenate(confidences)
+    class_ids, cut = np.concatenate(class_ids), np.concatenate(cut)
+    keep = merge_detections(boxes, confidences, class_ids, cut, model.nms_threshold)
+    result = (boxes[keep], confidences[keep], class_ids[keep], img_width, img_height)
+    if cache is not None:
+        cache.record_miss()
+        if cache.has_disk:
+            await run_in_threadpool(cache.put, key, result)
+        else:
+            cache.put(key, result)
+    return result
+
+async def detect_frame(scheduler, frame, timings=None):
+    """Detect an already decoded frame, bypassing the result cache.
+
+    Raw frames come from live sources that rarely repeat exactly, and hashing
+    megabytes of pixels per frame would cost more than the cache saves.
+    """
+    boxes, confidences, class_ids = await scheduler.submit(frame, timings)
+    img_height, img_width = frame.shape[:2]
+    return boxes, confidences, class_ids, img_width, img_height
+
+async def decode_raw(data, frame_format, width, height, stride=None, timings=None):
+    decode_started = time.perf_counter()
+    if frame_format == "bgr":
+        # BGR 帧只是对请求数据的零拷贝视图，无需进线程池
+        frame = raw_frame(data, frame_format, width, height, stride)
+    else:
+        frame = await run_in_threadpool(raw_frame, data, frame_format, width, height, stride)
+    if timings is not None:
+        timings["decode"] = time.perf_counter() - decode_started
+    return frame
 
 @router.post("/detect/")
-async def detect_objects(file: UploadFile = File(...), model_name: str = Query("SSD")):
+async def detect_objects(
+    file: UploadFile = File(...),
+    model_name: str = Query("SSD"),
+    tiled: bool = Query(False),
+    tile_size: int = Query(config.TILE_SIZE, ge=32),
+    tile_overlap: float = Query(config.TILE_OVERLAP, ge=0, lt=1),
+    full_image: bool = Query(config.TILE_FULL_IMAGE),
+    accept: Optional[str] = Header(None)
+):
+    """Detect objects in an uploaded image.
+
+    With ``tiled=true`` the image is split into ``tile_size`` squares that
+    overlap by ``tile_overlap`` so small objects in large frames keep their
+    resolution; ``full_image`` adds a pass over the whole image for objects
+    larger than a tile.
+
+    Clients sending ``Accept: application/x-detections`` get the packed
+    binary format of ``backend.services.encoding`` instead of JSON.
+    """
+    started = time.perf_counter()
+    timings = {}
+    model_name = select_model_name(model_name)
+    status = 500
+    scheduler = None
     try:
         content = await file.read()
-        nparr = np.frombuffer(content, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        timings["read"] = time.perf_counter() - started
 
-        if img is None:
-            raise HTTPException(status_code=400, detail="Unable to process image")
+        # 根据模型名称选择模型；持有引用期间模型不会被淘汰
+        scheduler = await registry.get(model_name)
+        model = scheduler.model
 
-        img_height, img_width, _ = img.shape
+        # 进行目标检测
+        try:
+            if tiled:
+                result = await detect_tiled(scheduler, content, tile_size, tile_overlap, full_image, timings)
+            else:
+                result = await detect_content(scheduler, content, timings)
+            boxes, confidences, class_ids, img_width, img_height = result
+        except (InvalidImageError, QueueFullError, SchedulerClosedError) as e:
+            status = status_of(e)
+            raise HTTPException(status_code=status, detail=str(e))
+        serialize_started = time.perf_counter()
+        response = detections_response(
+            model, boxes, confidences, class_ids, img_width, img_height, accept, file.filename
+        )
+        timings["serialize"] = time.perf_counter() - serialize_started
+        if config.SERVER_TIMING_HEADER:
+            response.headers["Server-Timing"] = server_timing(timings)
+        status = 200
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Detection failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if scheduler is not None:
+            await registry.release(model_name)
+        observe_request("detect", model_name, status, started, timings)
 
-        # 根据模型名称选择模型
-        if model_name == 'YOLOv5':
-            model = yolov5_model
-        elif model_name == 'YOLOv8':
-            model = yolov8_model
-        else:
-            model = ssd_model
+@router.post("/detect/raw")
+async def detect_raw_frame(
+    request: Request,
+    model_name: str = Query("SSD"),
+    frame_format: str = Header("bgr", alias="X-Frame-Format"),
+    frame_width: int = Header(..., alias="X-Frame-Width"),
+    frame_height: int = Header(..., alias="X-Frame-Height"),
+    frame_stride: Optional[int] = Header(None, alias="X-Frame-Stride"),
+    accept: Optional[str] = Header(None)
+):
+    """Detect objects in an uncompressed BGR or NV12 frame sent as the request body.
 
-        # 进行目标检测
-        boxes, confidences, class_ids = model.detect_objects(img)
-        detections = []
-        for i in range(len(boxes)):
-            box = clip_box_values(boxes[i], img_width, img_height)
-            detections.append({
-                "box": convert_to_standard_types(box),
-                "confidence": float(confidences[i]),
-                "class_id": int(class_ids[i]),
-                "class_name": model.class_names[int(class_ids[i])]
-            })
-
-        return {"detections": detections}
+    Skips JPEG encoding on the client and decoding on the server entirely; the
+    frame layout is described by the ``X-Frame-*`` headers. The response
+    format is negotiated through ``Accept`` as for ``/detect/``.
+    """
+    started = time.perf_counter()
+    timings = {}
+    model_name = select_model_name(model_name)
+    status = 500
+    scheduler = None
+    try:
+        data = await request.body()
+        timings["read"] = time.perf_counter() - started
+        scheduler = await registry.get(model_name)
+        try:
+            frame = await decode_raw(data, frame_format.lower(), frame_width, frame_height, frame_stride, timings)
+            boxes, confidences, class_ids, img_width, img_height = await detect_frame(scheduler, frame, timings)
+        except (InvalidImageError, QueueFullError, SchedulerClosedError) as e:
+            status = status_of(e)
+            raise HTTPException(status_code=status, detail=str(e))
+        serialize_started = time.perf_counter()
+        response = detections_response(scheduler.model, boxes, confidences, class_ids, img_width, img_height, accept)
+        timings["serialize"] = time.perf_counter() - serialize_started
+        if config.SERVER_TIMING_HEADER:
+            response.headers["Server-Timing"] = server_timing(timings)
+        status = 200
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Detection failed")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if scheduler is not None:
+            await registry.release(model_name)
+        observe_request("raw", model_name, status, started, timings)
+
+def detach_uploads(files):
+    """Take the spooled files away from their ``UploadFile`` wrappers.
+
+    FastAPI before 0.118 closes a request's uploads as soon as the endpoint
+    returns, before a ``StreamingResponse`` body is produced, so a body that
+    reads them must own the underlying files; the wrappers are left with
+    empty placeholders for FastAPI to close. Returns ``(filename, file)`` pairs.
+    """
+    detached = []
+    for file in files:
+        detached.append((file.filename or "", file.file))
+        file.file = io.BytesIO()
+    return detached
+
+async def iter_uploaded_images(files):
+    """Yield ``(filename, bytes)`` for every image in ``(filename, file)`` pairs, expanding zip/tar archives."""
+    for filename, fileobj in files:
+        archive = None
+        if not is_image_name(filename):
+            archive = await run_in_threadpool(list_archive_images, fileobj)
+        if archive is None:
+            fileobj.seek(0)
+            yield filename, await run_in_threadpool(fileobj.read)
+            continue
+        kind, handle, names = archive
+        for name in names:
+            yield name, await run_in_threadpool(read_archive_member, kind, handle, name)
+
+@router.post("/detect/batch")
+async def detect_objects_batch(files: List[UploadFile] = File(...), model_name: str = Query("SSD")):
+    """Detect objects in many images (or zip/tar archives of images) in one request.
+
+    Results are streamed back as NDJSON, one line per image in completion
+    order, with ``index`` giving the image's position in the upload.
+    """
+    model_name = select_model_name(model_name)
+    # 先加载模型，加载失败时仍以 HTTP 错误返回；引用由响应体自己持有，
+    # 响应体从未开始迭代（客户端提前断开）时不会泄漏引用
+    async with registry.use(model_name):
+        pass
+    uploads = detach_uploads(files)
+
+    async def run(scheduler, index, filename, content, limit):
+        started = time.perf_counter()
+        timings = {}
+        status = 200
+        try:
+            boxes, confidences, class_ids, img_width, img_height = await detect_content(scheduler, content, timings)
+            serialize_started = time.perf_counter()
+            detections = format_detections(scheduler.model, boxes, confidences, class_ids, img_width, img_height)
+            record_history(scheduler.model, class_ids, confidences, filename)
+            result = {"detections": detections}
+            timings["serialize"] = time.perf_counter() - serialize_started
+        except Exception as e:
+            status = status_of(e)
+            result = {"error": str(e)}
+        finally:
+            limit.release()
+            observe_request("batch", model_name, status, started, timings)
+        return {"index": index, "filename": filename, **result}
+
+    async def results():
+        # 限制同时处理的图片数，避免一次性解码整个上传并撑满调度队列
+        limit = asyncio.Semaphore(config.DETECT_BATCH_CONCURRENCY)
+        pending = set()
+        index = 0
+        scheduler = None
+        try:
+            scheduler = await registry.get(model_name)
+            async for filename, content in iter_uploaded_images(uploads):
+                await limit.acquire()
+                pending.add(asyncio.create_task(run(scheduler, index, filename, content, limit)))
+                index += 1
+                done = {task for task in pending if task.done()}
+                pending -= done
+                for task in done:
+                    yield json.dumps(task.result()) + "\n"
+            for task in asyncio.as_completed(pending):
+                yield json.dumps(await task) + "\n"
+            yield json.dumps({"done": True, "count": index}) + "\n"
+        finally:
+            for task in pending:
+                task.cancel()
+            for _, fileobj in uploads:
+                fileobj.close()
+            if scheduler is not None:
+                await registry.release(model_name)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/models")
+async def list_models():
+    return {
+        "available": list(MODEL_SPECS),
+        "loaded": registry.loaded_models,
+        "backends": {
+            model_name: dict(zip(("backend", "precision"), backend_for(model_name)))
+            for model_name in MODEL_SPECS
+        },
+        "memory_bytes": registry.memory_bytes,
+        "events": list(registry.events)
+    }
+
+@router.get("/models/{model_name}/classes")
+async def list_model_classes(model_name: str):
+    """Class names by class id, for decoding packed detection responses."""
+    if model_name not in MODEL_SPECS:
+        raise HTTPException(status_code=404, detail=f"Unknown model {model_name}")
+    class_names = MODEL_SPECS[model_name]["class_names"]
+    if isinstance(class_names, dict):
+        # 按类别 id 展开为列表，缺失的 id 留空
+        class_names = [class_names.get(class_id, "") for class_id in range(max(class_names, default=-1) + 1)]
+    return {"model_name": model_name, "class_names": list(class_names)}
+
+@router.get("/cache/stats")
+async def cache_stats():
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.snapshot()}
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import select, tuple_
+from backend.database import engine, DetectionHistory, ClassStatistic, ClassStatisticRollup, ROLLUP_GRANULARITIES
+from collections import defaultdict
+from typing import Optional
+import datetime
+
+router = APIRouter()
+
+def encode_cursor(row):
+    return f"{row.timestamp.isoformat()}_{row.id}"
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = cursor.rsplit("_", 1)
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/history")
+def read_history(
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    class_name: Optional[str] = None,
+    model_name: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Detections newest first, paged with an opaque ``cursor`` rather than OFFSET.
+
+    Every page is a range scan on ``ix_detection_history_timestamp`` (or the
+    ``(object_name, timestamp)`` index when filtering by class) that starts
+    right after the previous page, so deep pages cost the same as the first.
+    """
+    table = DetectionHistory.__table__
+    query = select(table).order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(limit)
+    if start is not None:
+        query = query.where(table.c.timestamp >= start)
+    if end is not None:
+        query = query.where(table.c.timestamp < end)
+    if class_name is not None:
+        query = query.where(table.c.object_name == class_name)
+    if model_name is not None:
+        query = query.where(table.c.model_name == model_name)
+    if cursor is not None:
+        query = query.where(tuple_(table.c.timestamp, table.c.id) < tuple_(*decode_cursor(cursor)))
+
+    with engine.connect() as conn:
+        rows = conn.execute(query).all()
+
+    return {
+        "items": [
+            {
+                "id": row.id,
+                "timestamp": row.timestamp.isoformat(),
+                "model_name": row.model_name,
+                "class_name": row.object_name,
+                "confidence": row.confidence,
+                "image_path": row.image_path
+            }
+            for row in rows
+        ],
+        "next_cursor": encode_cursor(rows[-1]) if len(rows) == limit else None
+    }
+
+@router.get("/statistics")
+def read_statistics(
+    granularity: str = Query("hour"),
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    class_name: Optional[str] = None,
+    top: Optional[int] = Query(None, ge=1)
+):
+    """Per-class counts per time bucket, read from the incrementally maintained rollups.
+
+    With ``top``, only the ``top`` most frequent classes of each bucket are returned.
+    """
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {list(ROLLUP_GRANULARITIES)}")
+    table = ClassStatisticRollup.__table__
+    query = select(table.c.bucket_start, table.c.class_name, table.c.count, table.c.confidence_sum) \
+        .where(table.c.granularity == granularity) \
+        .order_by(table.c.bucket_start)
+    if start is not None:
+        query = query.where(table.c.bucket_start >= ROLLUP_GRANULARITIES[granularity](start))
+    if end is not None:
+        query = query.where(table.c.bucket_start < end)
+    if class_name is not None:
+        query = query.where(table.c.class_name == class_name)
+
+    with engine.connect() as conn:
+        rows = conn.execute(query).all()
+
+    buckets = defaultdict(list)
+    for row in rows:
+        buckets[row.bucket_start].append({
+            "class_name": row.class_name,
+            "count": row.count,
+            "mean_confidence": row.confidence_sum / row.count if row.count else 0.0
+        })
+
+    result = []
+    for bucket_start, classes in buckets.items():
+        classes.sort(key=lambda item: item["count"], reverse=True)
+        result.append({
+            "bucket_start": bucket_start.isoformat(),
+            "total": sum(item["count"] for item in classes),
+            "classes": classes[:top] if top is not None else classes
+        })
+    return {"granularity": granularity, "buckets": result}
+
+@router.get("/statistics/classes")
+def read_class_totals():
+    table = ClassStatistic.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(select(table.c.class_name, table.c.count).order_by(table.c.count.desc())).all()
+    return {"classes": [{"class_name": row.class_name, "count": row.count} for row in rows]}
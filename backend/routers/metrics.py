@@ -0,0 +1,86 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from backend.routers import detection, cameras
+from backend.services.metrics import registry as metrics_registry, Counter, Gauge
+
+router = APIRouter()
+
+def collect_queue_depths():
+    return {(name,): scheduler.queue_depth for name, scheduler in detection.registry.entries.items()}
+
+def collect_in_flight():
+    return {(name,): scheduler.in_flight for name, scheduler in detection.registry.entries.items()}
+
+def collect_loaded_models():
+    return {
+        (name, getattr(scheduler.model, "backend_name", ""), getattr(scheduler.model, "precision", "")): 1
+        for name, scheduler in detection.registry.entries.items()
+    }
+
+def collect_cache_lookups():
+    if detection.result_cache is None:
+        return {}
+    return {(result,): count for result, count in detection.result_cache.snapshot().items()
+            if result in ("hits", "disk_hits", "phash_hits", "misses")}
+
+def collect_cache_entries():
+    if detection.result_cache is None:
+        return {}
+    return {(): detection.result_cache.snapshot()["entries"]}
+
+def collect_history_queue():
+    if detection.history_writer is None:
+        return {}
+    return {(): detection.history_writer.queue_depth}
+
+def collect_history_rows():
+    if detection.history_writer is None:
+        return {}
+    stats = detection.history_writer.stats
+    return {(result,): stats[result] for result in ("written", "dropped", "failed")}
+
+def collect_camera_frames():
+    return {
+        (stream_id, result): count
+        for stream_id, stream in cameras.cameras.streams.items()
+        for result, count in {**stream.capture.stats, **stream.stats}.items()
+        if result != "reconnects"
+    }
+
+def collect_camera_fps():
+    return {(stream_id,): stream.fps for stream_id, stream in cameras.cameras.streams.items()}
+
+# 这些指标在抓取时从各组件已有的计数中读取，不给请求路径增加任何开销
+metrics_registry.register(Gauge(
+    "detect_queue_depth", "Frames waiting in each model's batch queue.", ("model",), collect=collect_queue_depths
+))
+metrics_registry.register(Gauge(
+    "detect_batches_in_flight", "Batches currently running per model.", ("model",), collect=collect_in_flight
+))
+metrics_registry.register(Gauge(
+    "model_loaded", "Models currently resident in the registry, with the backend and precision they run on.",
+    ("model", "backend", "precision"), collect=collect_loaded_models
+))
+metrics_registry.register(Counter(
+    "result_cache_lookups", "Result cache lookups by outcome.", ("result",), collect=collect_cache_lookups
+))
+metrics_registry.register(Gauge(
+    "result_cache_entries", "Entries in the in-memory result cache.", collect=collect_cache_entries
+))
+metrics_registry.register(Gauge(
+    "history_queue_depth", "Detections waiting to be persisted.", collect=collect_history_queue
+))
+metrics_registry.register(Counter(
+    "history_rows", "Detection history rows by outcome.", ("result",), collect=collect_history_rows
+))
+metrics_registry.register(Counter(
+    "camera_frames", "Camera frames captured, dropped, inferred, skipped, rejected or failed.", ("camera", "result"),
+    collect=collect_camera_frames
+))
+metrics_registry.register(Gauge(
+    "camera_fps", "Detection results published per second for each camera.", ("camera",), collect=collect_camera_fps
+))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
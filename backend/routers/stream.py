@@ -0,0 +1,249 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from backend.routers.detection import (
+    registry, select_model_name, format_detections, detect_content, detect_frame, decode_raw, record_history,
+    observe_request, status_of, InvalidImageError
+)
+from backend.services.batching import QueueFullError, SchedulerClosedError
+from backend.services.ingest import preview_gray
+from backend.services.motion import MotionGate, IoUTracker
+from backend.services.metrics import STREAM_FRAMES
+from starlette.concurrency import run_in_threadpool
+from backend import config
+from collections import deque
+import asyncio
+import json
+import logging
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 二进制消息格式：4 字节小端序列号 + JPEG 数据（或按 frame_format 控制消息约定的原始帧）
+FRAME_HEADER = struct.Struct("<I")
+
+
+class FrameStream:
+    """Per-connection state for /ws/detect.
+
+    Incoming frames go into a bounded deque, so when inference falls behind the
+    oldest unprocessed frames are dropped and latency stays bounded. Up to
+    ``max_in_flight`` frames are processed at once so they can share a batch.
+
+    With the motion gate on, frames that barely differ from the last inferred
+    one are answered with its detections (``inferred`` is false and ``age``
+    counts the frames since), and detections carry a ``track_id`` that stays
+    the same across inferences.
+    """
+
+    def __init__(self, websocket, model_name, motion_gate=False):
+        self.websocket = websocket
+        self.model_name = model_name
+        self.gate = None
+        self.tracker = None
+        # 最近一次推理的 (model_name, detections)，供静止帧复用
+        self.last_detections = None
+        # 门控判定按到达顺序串行；inference 为最近一次推理帧的“已发送”future
+        self.gate_lock = asyncio.Lock()
+        self.inference = None
+        if motion_gate:
+            self.enable_motion_gate()
+        # None 表示编码图片；原始帧时为 (frame_format, width, height, stride)
+        self.raw_layout = None
+        self.pending = deque(maxlen=config.WS_MAX_PENDING_FRAMES)
+        self.ready = asyncio.Event()
+        self.send_lock = asyncio.Lock()
+        self.dropped = 0
+
+    async def send(self, message):
+        async with self.send_lock:
+            await self.websocket.send_text(json.dumps(message))
+
+    async def receive(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("text") is not None:
+                await self.control(message["text"])
+                continue
+            data = message.get("bytes")
+            if not data or len(data) <= FRAME_HEADER.size:
+                continue
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            (seq,) = FRAME_HEADER.unpack_from(data)
+            # 帧布局随帧入队，处理时切换格式不会影响已排队的帧
+            self.pending.append((seq, memoryview(data)[FRAME_HEADER.size:], self.raw_layout))
+            self.ready.set()
+
+    async def control(self, text):
+        """Apply a text control message; malformed ones are answered with an error, not a disconnect."""
+        # 文本消息用于控制，例如 {"model_name": "YOLOv8"} 或
+        # {"frame_format": "nv12", "width": 1920, "height": 1080, "stride": 1920}
+        try:
+            control = json.loads(text)
+        except ValueError as e:
+            await self.send({"error": f"Invalid control message: {e}"})
+            return
+        if not isinstance(control, dict):
+            await self.send({"error": "Control messages must be JSON objects"})
+            return
+        if "model_name" in control:
+            if not isinstance(control["model_name"], str):
+                await self.send({"error": "model_name must be a string"})
+                return
+            self.model_name = select_model_name(control["model_name"])
+            if self.tracker is not None:
+                # 不同模型的类别编号不同，轨迹不能延续
+                self.tracker = IoUTracker(config.TRACK_IOU_THRESHOLD)
+        if "motion_gate" in control:
+            if control["motion_gate"]:
+                self.enable_motion_gate()
+            else:
+                self.gate = self.tracker = self.last_detections = None
+        if "frame_format" in control:
+            try:
+                self.set_frame_format(control)
+            except (KeyError, TypeError, ValueError) as e:
+                await self.send({"error": f"Invalid frame format: {e}"})
+
+    def enable_motion_gate(self):
+        self.gate = MotionGate(
+            pixel_delta=config.MOTION_PIXEL_DELTA,
+            min_changed=config.MOTION_MIN_CHANGED,
+            keyframe_interval=config.MOTION_KEYFRAME_INTERVAL
+        )
+        self.tracker = IoUTracker(config.TRACK_IOU_THRESHOLD)
+        self.last_detections = None
+
+    def set_frame_format(self, control):
+        frame_format = str(control["frame_format"]).lower()
+        if frame_format in ("jpeg", "encoded"):
+            self.raw_layout = None
+            return
+        stride = control.get("stride")
+        self.raw_layout = (
+            frame_format, int(control["width"]), int(control["height"]), int(stride) if stride else None
+        )
+
+    async def process(self):
+        while True:
+            while not self.pending:
+                self.ready.clear()
+                await self.ready.wait()
+            seq, data, raw_layout = self.pending.popleft()
+            # 该帧结果发送后完成；门控判定为需要推理时，后续静止帧会等待它
+            sent = asyncio.get_running_loop().create_future()
+            try:
+                try:
+                    result = await self.detect(seq, data, raw_layout, sent)
+                except Exception as e:
+                    logger.exception("Detection failed for frame %s", seq)
+                    result = {"seq": seq, "error": str(e)}
+                await self.send(result)
+            finally:
+                if not sent.done():
+                    sent.set_result(None)
+
+    async def reuse_detections(self, gate, data, raw_layout, model_name, sent):
+        """Return ``(detections, age)`` if the motion gate lets this frame skip inference, else ``None``.
+
+        Gate decisions are made one frame at a time in arrival order. A
+        skipped frame is answered only after the connection's latest
+        inference has been sent, so it reuses that inference's detections
+        and never overtakes it with older ones.
+        """
+        async with self.gate_lock:
+            try:
+                preview = await run_in_threadpool(preview_gray, data, raw_layout, gate.size)
+            except InvalidImageError:
+                # 让正常检测流程报告无效帧
+                return None
+            thumbnail = gate.thumbnail(preview)
+            last = self.last_detections
+            stale = last is None or last[0] != model_name
+            if gate.should_infer(thumbnail) or stale:
+                self.inference = sent
+                return None
+            age = gate.skipped
+            inference = self.inference
+        if inference is not None:
+            await asyncio.shield(inference)
+        last = self.last_detections
+        if last is None or last[0] != model_name:
+            # 推理失败或期间切换了模型，没有可复用的结果
+            return None
+        return last[1], age
+
+    async def detect(self, seq, data, raw_layout=None, sent=None):
+        started = time.perf_counter()
+        timings = {}
+        model_name = self.model_name
+        status = 500
+        try:
+            gate = self.gate
+            if gate is not None:
+                reused = await self.reuse_detections(gate, data, raw_layout, model_name, sent)
+                if reused is not None:
+                    detections, age = reused
+                    STREAM_FRAMES.inc(model_name, "skipped")
+                    status = 200
+                    return {
+                        "seq": seq,
+                        "model_name": model_name,
+                        "dropped": self.dropped,
+                        "inferred": False,
+                        "age": age,
+                        "detections": detections
+                    }
+            async with registry.use(model_name) as scheduler:
+                try:
+                    if raw_layout is None:
+                        result = await detect_content(scheduler, data, timings)
+                    else:
+                        frame = await decode_raw(data, *raw_layout, timings=timings)
+                        result = await detect_frame(scheduler, frame, timings)
+                    boxes, confidences, class_ids, img_width, img_height = result
+                except (InvalidImageError, QueueFullError, SchedulerClosedError) as e:
+                    status = status_of(e)
+                    return {"seq": seq, "error": str(e)}
+            STREAM_FRAMES.inc(model_name, "inferred")
+            serialize_started = time.perf_counter()
+            detections = format_detections(scheduler.model, boxes, confidences, class_ids, img_width, img_height)
+            record_history(scheduler.model, class_ids, confidences)
+            message = {
+                "seq": seq,
+                "model_name": model_name,
+                "dropped": self.dropped,
+                "detections": detections
+            }
+            if self.gate is not None:
+                for detection, track_id in zip(detections, self.tracker.update(boxes, class_ids)):
+                    detection["track_id"] = int(track_id)
+                self.last_detections = (model_name, detections)
+                message.update(inferred=True, age=0)
+            timings["serialize"] = time.perf_counter() - serialize_started
+            status = 200
+            return message
+        finally:
+            observe_request("ws", model_name, status, started, timings)
+
+
+@router.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket, model_name: str = "SSD", motion_gate: bool = config.WS_MOTION_GATE):
+    await websocket.accept()
+    stream = FrameStream(websocket, select_model_name(model_name), motion_gate)
+    tasks = [asyncio.create_task(stream.receive())]
+    tasks += [asyncio.create_task(stream.process()) for _ in range(config.WS_MAX_IN_FLIGHT)]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.error("Detection stream failed", exc_info=error)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,33 @@
+import os
+import tarfile
+import zipfile
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+def is_image_name(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def list_archive_images(fileobj):
+    """Return ``(kind, archive, names)`` for a zip or tar upload, or ``None``."""
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        archive = zipfile.ZipFile(fileobj)
+        names = [info.filename for info in archive.infolist() if not info.is_dir() and is_image_name(info.filename)]
+        return "zip", archive, names
+    fileobj.seek(0)
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r:*")
+    except tarfile.TarError:
+        fileobj.seek(0)
+        return None
+    names = [member.name for member in archive.getmembers() if member.isfile() and is_image_name(member.name)]
+    return "tar", archive, names
+
+
+def read_archive_member(kind, archive, name):
+    if kind == "zip":
+        return archive.read(name)
+    return archive.extractfile(name).read()
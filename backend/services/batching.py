@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services.metrics import BATCH_SIZE, observe_stages
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a scheduler's request queue is at capacity."""
+
+
+class SchedulerClosedError(Exception):
+    """Raised when frames are submitted to a scheduler that has been stopped."""
+
+
+class BatchScheduler:
+    """Collects single-frame requests for one model into batched forward passes.
+
+    A worker task takes the first queued frame, then keeps collecting until it
+    has ``max_batch_size`` frames or ``max_wait_ms`` has passed, and runs the
+    whole batch on a dedicated thread so the event loop is never blocked by
+    ``net.forward``. Up to ``concurrency`` batches may be in flight at once.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=5, max_queue_size=64, concurrency=1):
+        self.model = model
+        self.concurrency = concurrency
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._in_flight = set()
+        self._closed = False
+        # cv2.dnn.Net is not thread-safe, so an in-process model gets exactly one
+        # thread; a worker pool can take one batch per worker process.
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"infer-{model.model_name}")
+
+    def start(self):
+        if self._closed:
+            raise SchedulerClosedError(f"{self.model.model_name} scheduler has been stopped")
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            while not self._queue.empty():
+                _, future, _, _ = self._queue.get_nowait()
+                future.cancel()
+        self._executor.shutdown(wait=False)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight)
+
+    @property
+    def busy(self):
+        return self.queue_depth > 0 or bool(self._in_flight)
+
+    async def submit(self, frame, timings=None):
+        """Detect ``frame`` as part of the next batch.
+
+        If ``timings`` is a dict, the time spent queued and the batch's model
+        stage timings are added to it.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((frame, future, timings, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self.model.model_name} queue is full ({self.max_queue_size})")
+        return await future
+
+    async def submit_many(self, frames, timings=None):
+        """Detect a group of frames belonging to one request, such as image tiles.
+
+        The frames are queued back to back so they fill whole batches, but at
+        most ``max_batch_size * concurrency`` of them wait in the queue at a
+        time, so a large group neither fails with ``QueueFullError`` nor
+        starves other requests of queue space. If ``timings`` is a dict, the
+        model stage timings of all batches involved are summed into it.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        window = self.max_batch_size * self.concurrency
+        futures = []
+        tile_timings = [{} for _ in frames] if timings is not None else [None] * len(frames)
+        try:
+            for i, frame in enumerate(frames):
+                if i >= window:
+                    await asyncio.wait((futures[i - window],))
+                future = loop.create_future()
+                await self._queue.put((frame, future, tile_timings[i], time.perf_counter()))
+                futures.append(future)
+            results = await asyncio.gather(*futures)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        if timings is not None:
+            # Every frame of a batch carries that batch's timings, so count each batch once.
+            batches = {
+                tuple((stage, seconds) for stage, seconds in item.items() if stage != "queue")
+                for item in tile_timings
+            }
+            for batch_timings in batches:
+                for stage, seconds in batch_timings:
+                    timings[stage] = timings.get(stage, 0.0) + seconds
+        return results
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            # asyncio.wait leaves the getter alone on timeout (unlike wait_for),
+            # so cancelling it afterwards cannot lose an item or a cancellation.
+            getter = loop.create_task(self._queue.get())
+            await asyncio.wait((getter,), timeout=timeout)
+            if not getter.done():
+                getter.cancel()
+                break
+            batch.append(getter.result())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = loop.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            # Requests whose client already went away don't need a forward pass.
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                return
+            frames = [frame for frame, _, _, _ in batch]
+            started = time.perf_counter()
+            batch_timings = {}
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.model.detect_batch, frames, batch_timings
+                )
+            except Exception as e:
+                logger.exception("Batched inference failed for %s", self.model.model_name)
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            BATCH_SIZE.observe(len(frames), self.model.model_name)
+            observe_stages(self.model.model_name, batch_timings)
+            for (_, future, timings, enqueued), result in zip(batch, results):
+                if timings is not None:
+                    timings["queue"] = started - enqueued
+                    timings.update(batch_timings)
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
@@ -0,0 +1,317 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+def parse_source(source):
+    """Device indices arrive as strings from config and JSON; cv2 wants an int."""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class CameraSource:
+    """Reads one video source on its own thread into a latest-frame-wins slot.
+
+    Only the newest frame is kept: when inference is slower than the camera,
+    older frames are overwritten (and counted in ``dropped``) instead of
+    queueing up, so results stay current. Local files are read at their own
+    frame rate and can loop; live sources are reopened with backoff when
+    they fail.
+    """
+
+    def __init__(self, source, loop_video=True, on_frame=None, max_backoff=10.0):
+        self.source = parse_source(source)
+        self.loop_video = loop_video
+        self.on_frame = on_frame
+        self.max_backoff = max_backoff
+        self.is_file = isinstance(self.source, str) and os.path.exists(self.source)
+        self.stats = {"captured": 0, "dropped": 0, "reconnects": 0}
+        self.state = "starting"
+        self._lock = threading.Lock()
+        self._frame = None
+        self._seq = 0
+        self._consumed = True
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"capture-{self.source}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def latest(self):
+        """Return ``(seq, frame)`` of the newest frame, or ``(0, None)`` before the first one."""
+        with self._lock:
+            self._consumed = True
+            return self._seq, self._frame
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def _publish(self, frame):
+        with self._lock:
+            if not self._consumed:
+                self.stats["dropped"] += 1
+            self._frame = frame
+            self._seq += 1
+            self._consumed = False
+        self.stats["captured"] += 1
+        if self.on_frame is not None:
+            self.on_frame()
+
+    def _run(self):
+        backoff = 0.5
+        while not self._stop.is_set():
+            capture = cv2.VideoCapture(self.source)
+            if not capture.isOpened():
+                self.state = "unavailable"
+                if self.is_file:
+                    logger.error("Cannot open video file %s", self.source)
+                    return
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                self.stats["reconnects"] += 1
+                continue
+            self.state = "running"
+            backoff = 0.5
+            try:
+                ended = self._read(capture)
+            finally:
+                capture.release()
+            if ended:
+                self.state = "ended"
+                return
+            self.stats["reconnects"] += 1
+
+    def _read(self, capture):
+        """Read frames until stopped or the source fails; True when a file reached its end."""
+        interval = 0.0
+        if self.is_file:
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            interval = 1.0 / fps if fps and fps > 0 else 0.0
+        next_frame = time.monotonic()
+        while not self._stop.is_set():
+            ok, frame = capture.read()
+            if not ok:
+                if self.is_file and self.loop_video and self.stats["captured"]:
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                return self.is_file
+            self._publish(frame)
+            if interval:
+                # 按文件自身帧率播放，避免本地文件以解码速度灌入
+                next_frame += interval
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    next_frame = time.monotonic()
+        return False
+
+
+class CameraStream:
+    """A registered camera: its source, scheduling parameters and latest result."""
+
+    def __init__(self, stream_id, source, model_name, target_fps=0.0, priority=1.0, loop_video=True):
+        self.stream_id = stream_id
+        self.model_name = model_name
+        self.target_fps = target_fps
+        self.priority = priority
+        self.capture = CameraSource(source, loop_video)
+        self.last_seq = 0
+        self.next_due = 0.0
+        # 步长调度的虚拟时间：每次推理增加 1/priority，优先选择最小者
+        self.pass_value = 0.0
+        self.in_flight = False
+        self.latest = None
+        self.subscribers = set()
+        # 可选的运动门控（见 backend.services.motion），由调用方设置
+        self.gate = None
+        self.tracker = None
+        self.last_detections = None
+        self.stats = {"inferred": 0, "skipped": 0, "rejected": 0, "errors": 0}
+        self._last_result_at = None
+        self.fps = 0.0
+
+    def ready(self, now):
+        return not self.in_flight and self.capture.seq > self.last_seq and now >= self.next_due
+
+    def publish(self, result):
+        now = time.monotonic()
+        if self._last_result_at is not None and now > self._last_result_at:
+            # 实际处理帧率的指数滑动平均
+            self.fps = 0.8 * self.fps + 0.2 / (now - self._last_result_at)
+        self._last_result_at = now
+        self.latest = result
+        for subscriber in self.subscribers:
+            if subscriber.full():
+                subscriber.get_nowait()
+            subscriber.put_nowait(result)
+
+    def snapshot(self):
+        return {
+            "stream_id": self.stream_id,
+            "source": str(self.capture.source),
+            "state": self.capture.state,
+            "model_name": self.model_name,
+            "target_fps": self.target_fps,
+            "priority": self.priority,
+            "fps": round(self.fps, 2),
+            **self.capture.stats,
+            **self.stats
+        }
+
+
+class CameraScheduler:
+    """Shares inference capacity between camera streams.
+
+    At most ``max_in_flight`` frames (from all streams together) are being
+    detected at once, and at most one per stream, always its newest frame.
+    Whenever capacity frees up, the ready stream with the lowest pass value
+    goes next, and its pass value grows by ``1 / priority`` (stride
+    scheduling), so over time streams get inference in proportion to their
+    priority and a busy stream cannot starve the others. ``target_fps`` caps
+    how often a stream is considered at all.
+
+    ``detect(stream, frame)`` is awaited for each frame and returns the result
+    to publish, or ``None`` to publish nothing.
+    """
+
+    def __init__(self, detect, max_in_flight=8):
+        self.detect = detect
+        self.max_in_flight = max_in_flight
+        self.streams = {}
+        self._ids = itertools.count(1)
+        self._in_flight = set()
+        self._virtual_time = 0.0
+        self._wakeup = None
+        self._loop = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._spawn()
+
+    def _spawn(self):
+        self._task = self._loop.create_task(self._run())
+        self._task.add_done_callback(self._supervise)
+
+    def _supervise(self, task):
+        # 调度循环意外退出时所有摄像头都会停止推理，记录错误并在稍后重启
+        if task.cancelled() or task is not self._task:
+            return
+        logger.error("Camera scheduler loop failed; restarting it", exc_info=task.exception())
+        self._loop.call_later(1.0, self._restart, task)
+
+    def _restart(self, failed_task):
+        if self._task is failed_task:
+            self._spawn()
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for stream in self.streams.values():
+            await asyncio.get_running_loop().run_in_executor(None, stream.capture.stop)
+
+    def add(self, source, model_name, target_fps=0.0, priority=1.0, loop_video=True, stream_id=None):
+        stream_id = stream_id or str(next(self._ids))
+        if stream_id in self.streams:
+            raise KeyError(f"Stream {stream_id} already exists")
+        stream = CameraStream(stream_id, source, model_name, target_fps, priority, loop_video)
+        stream.pass_value = self._virtual_time
+        stream.capture.on_frame = self._notify
+        self.streams[stream_id] = stream
+        stream.capture.start()
+        return stream
+
+    def remove(self, stream_id):
+        stream = self.streams.pop(stream_id)
+        stream.capture.stop(timeout=0)
+        return stream
+
+    def _notify(self):
+        # Called from capture threads.
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                # The event loop has already shut down.
+                pass
+
+    def _pick(self, now):
+        ready = [stream for stream in self.streams.values() if stream.ready(now)]
+        for stream in ready:
+            # 空闲或限速期间不累积额度，否则恢复后会连续抢占推理
+            stream.pass_value = max(stream.pass_value, self._virtual_time)
+        return min(ready, key=lambda stream: stream.pass_value, default=None)
+
+    def _next_due(self, now):
+        waiting = [
+            stream.next_due for stream in self.streams.values()
+            if not stream.in_flight and stream.capture.seq > stream.last_seq and stream.next_due > now
+        ]
+        return min(waiting, default=None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            while len(self._in_flight) < self.max_in_flight:
+                stream = self._pick(now)
+                if stream is None:
+                    break
+                self._dispatch(stream, now)
+            due = self._next_due(now)
+            waiter = loop.create_task(self._wakeup.wait())
+            try:
+                await asyncio.wait((waiter,), timeout=None if due is None else due - now)
+            finally:
+                waiter.cancel()
+
+    def _dispatch(self, stream, now):
+        seq, frame = stream.capture.latest()
+        stream.last_seq = seq
+        stream.in_flight = True
+        self._virtual_time = stream.pass_value
+        stream.pass_value += 1.0 / max(stream.priority, 1e-3)
+        if stream.target_fps > 0:
+            stream.next_due = now + 1.0 / stream.target_fps
+        task = asyncio.get_running_loop().create_task(self._process(stream, seq, frame))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _process(self, stream, seq, frame):
+        try:
+            result = await self.detect(stream, frame)
+            if result is not None:
+                stream.publish({"stream_id": stream.stream_id, "seq": seq, "timestamp": time.time(), **result})
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stream.stats["errors"] += 1
+            logger.exception("Detection failed for camera %s", stream.stream_id)
+        finally:
+            stream.in_flight = False
+            self._wakeup.set()
@@ -0,0 +1,72 @@
+import struct
+
+import numpy as np
+
+# 紧凑二进制结果格式：客户端在 Accept 中请求该类型时使用，默认仍为 JSON
+DETECTIONS_MEDIA_TYPE = "application/x-detections"
+DETECTIONS_MAGIC = b"DET1"
+# magic, box count, image width, image height
+DETECTIONS_HEADER = struct.Struct("<4sIII")
+
+
+def clip_boxes(boxes, img_width, img_height):
+    """Clip xyxy ``boxes`` to the image, the vectorized form of a per-box clip.
+
+    Only the sides that can leave the image are clipped: the top-left corner
+    at 0 and the bottom-right corner at the image size.
+    """
+    boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+    np.maximum(boxes[:, :2], 0, out=boxes[:, :2])
+    np.minimum(boxes[:, 2], img_width, out=boxes[:, 2])
+    np.minimum(boxes[:, 3], img_height, out=boxes[:, 3])
+    return boxes
+
+
+def pack_detections(boxes, confidences, class_ids, img_width, img_height):
+    """Pack detections as a little-endian struct of arrays.
+
+    A 16-byte header (magic ``DET1``, count N, image width, image height) is
+    followed by N boxes as int32 ``x1, y1, x2, y2``, N float32 confidences
+    and N int32 class ids. Class names are not repeated per box; clients
+    fetch them once per model from ``/models/{model_name}/classes``.
+    """
+    boxes = clip_boxes(boxes, img_width, img_height)
+    return b"".join((
+        DETECTIONS_HEADER.pack(DETECTIONS_MAGIC, len(boxes), img_width, img_height),
+        boxes.astype("<i4", copy=False).tobytes(),
+        np.asarray(confidences).astype("<f4", copy=False).tobytes(),
+        np.asarray(class_ids).astype("<i4", copy=False).tobytes()
+    ))
+
+
+def unpack_detections(data):
+    """Inverse of ``pack_detections``; returns ``(boxes, confidences, class_ids, img_width, img_height)``."""
+    magic, count, img_width, img_height = DETECTIONS_HEADER.unpack_from(data)
+    if magic != DETECTIONS_MAGIC:
+        raise ValueError("Not a packed detections payload")
+    offset = DETECTIONS_HEADER.size
+    boxes = np.frombuffer(data, "<i4", count * 4, offset).reshape(count, 4)
+    offset += boxes.nbytes
+    confidences = np.frombuffer(data, "<f4", count, offset)
+    class_ids = np.frombuffer(data, "<i4", count, offset + confidences.nbytes)
+    return boxes, confidences, class_ids, img_width, img_height
+
+
+def accepts_packed(accept):
+    """Whether an ``Accept`` header prefers packed detections over JSON."""
+    if not accept:
+        return False
+    preferences = {}
+    for item in accept.split(","):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        preferences[media_type.lower()] = quality
+    packed = preferences.get(DETECTIONS_MEDIA_TYPE, 0.0)
+    # 只有显式列出该类型的客户端才会收到二进制结果，*/* 仍返回 JSON
+    return packed > 0 and packed >= preferences.get("application/json", 0.0)
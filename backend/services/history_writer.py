@@ -0,0 +1,152 @@
+import datetime
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from backend.database import ClassStatistic, ClassStatisticRollup, DetectionHistory, ROLLUP_GRANULARITIES
+
+logger = logging.getLogger(__name__)
+
+
+def increment_upsert(dialect, model, key_columns, increments):
+    """An INSERT that adds the ``increments`` columns onto an existing row with the same key.
+
+    Upserts have no portable SQL form, so this picks the dialect's own
+    construct; databases other than SQLite, PostgreSQL and MySQL/MariaDB are
+    not supported.
+    """
+    if dialect in ("sqlite", "postgresql"):
+        statement = (sqlite if dialect == "sqlite" else postgresql).insert(model)
+        return statement.on_conflict_do_update(
+            index_elements=[getattr(model, column) for column in key_columns],
+            set_={column: getattr(model, column) + statement.excluded[column] for column in increments}
+        )
+    if dialect in ("mysql", "mariadb"):
+        statement = mysql.insert(model)
+        return statement.on_duplicate_key_update(
+            {column: getattr(model, column) + statement.inserted[column] for column in increments}
+        )
+    raise ValueError(f"Detection history does not support the {dialect} database dialect")
+
+
+class HistoryWriter:
+    """Persists detections from a background thread in bulk transactions.
+
+    ``record`` only does a non-blocking put on a bounded queue, so a slow disk
+    can never add latency to a request: when the queue is full the detections
+    are dropped and counted instead. The writer thread drains up to
+    ``batch_size`` rows or waits ``flush_interval`` seconds, then inserts them
+    with a single executemany and folds the per-class counts into
+    ``class_statistics`` and the minute/hour/day ``class_statistic_rollups``
+    with one upsert per class and bucket.
+    """
+
+    def __init__(self, engine, max_queue_size=10000, batch_size=2000, flush_interval=0.5):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "failed": 0}
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        # 在构造时选定方言的 upsert，不支持的数据库在启动时即报错
+        dialect = engine.dialect.name
+        self._upsert = increment_upsert(dialect, ClassStatistic, ["class_name"], ["count"])
+        self._rollup_upsert = increment_upsert(
+            dialect, ClassStatisticRollup, ["granularity", "bucket_start", "class_name"], ["count", "confidence_sum"]
+        )
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def record(self, model_name, class_names, class_ids, confidences, image_path=None, timestamp=None):
+        """Queue one image's detections, given as arrays plus the model's class-name table.
+
+        Rows are built on the writer thread, so recording costs the request
+        no per-box work.
+        """
+        if len(class_ids) == 0:
+            return
+        item = (timestamp or datetime.datetime.now(), model_name, class_names, class_ids, confidences, image_path)
+        try:
+            self._queue.put_nowait(item)
+            self.stats["queued"] += 1
+        except queue.Full:
+            self.stats["dropped"] += len(class_ids)
+
+    def _collect(self):
+        rows = []
+        stopping = False
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stopping = True
+                break
+            timestamp, model_name, class_names, class_ids, confidences, image_path = item
+            rows.extend(
+                {
+                    "timestamp": timestamp,
+                    "model_name": model_name,
+                    "object_name": class_names[class_id],
+                    "confidence": confidence,
+                    "image_path": image_path
+                }
+                for class_id, confidence in zip(
+                    np.asarray(class_ids).tolist(), np.asarray(confidences, dtype=np.float64).tolist()
+                )
+            )
+        return rows, stopping
+
+    def _run(self):
+        while True:
+            rows, stopping = self._collect()
+            if rows:
+                try:
+                    self.flush(rows)
+                except Exception:
+                    self.stats["failed"] += len(rows)
+                    logger.exception("Failed to persist %d detections", len(rows))
+            if stopping:
+                return
+
+    def flush(self, rows):
+        counts = Counter(row["object_name"] for row in rows)
+        rollups = {}
+        for row in rows:
+            for granularity, truncate in ROLLUP_GRANULARITIES.items():
+                key = (granularity, truncate(row["timestamp"]), row["object_name"])
+                count, confidence_sum = rollups.get(key, (0, 0.0))
+                rollups[key] = (count + 1, confidence_sum + row["confidence"])
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(DetectionHistory), rows)
+            conn.execute(self._upsert, [{"class_name": name, "count": count} for name, count in counts.items()])
+            conn.execute(self._rollup_upsert, [
+                {"granularity": granularity, "bucket_start": bucket_start, "class_name": class_name,
+                 "count": count, "confidence_sum": confidence_sum}
+                for (granularity, bucket_start, class_name), (count, confidence_sum) in rollups.items()
+            ])
+        self.stats["written"] += len(rows)
@@ -0,0 +1,139 @@
+import struct
+
+import cv2
+import numpy as np
+
+from backend.models.object_detection_model import fit_to_input
+
+RAW_FORMATS = ("bgr", "nv12")
+
+# libjpeg 可在 IDCT 阶段直接按 1/2、1/4、1/8 解码，按从大到小尝试
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_UINT16 = struct.Struct(">H")
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def jpeg_size(content):
+    """Read ``(width, height)`` from a JPEG's frame header without decoding it."""
+    if content[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 4 <= len(content):
+        if content[i] != 0xFF:
+            return None
+        marker = content[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            if i + 9 > len(content):
+                return None
+            height, width = struct.unpack_from(">HH", content, i + 5)
+            return width, height
+        (length,) = _UINT16.unpack_from(content, i + 2)
+        i += 2 + length
+    return None
+
+
+def reduction_factor(width, height, target_size):
+    """The largest libjpeg downscale that keeps the image at least ``target_size``."""
+    target_width, target_height = target_size
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if width // factor >= target_width and height // factor >= target_height:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def decode_image(content, preprocessing=None):
+    """Decode an encoded image, at reduced resolution when it is far larger than the net input.
+
+    ``preprocessing`` is the model's ``PREPROCESSING`` entry; the image is
+    never decoded smaller than the size it will be resized to for the net.
+    Returns ``(img, (width, height))`` where the size is that of the original
+    image; scale boxes found on ``img`` back with ``scale_boxes``.
+    """
+    buffer = np.frombuffer(content, np.uint8)
+    size = jpeg_size(content) if preprocessing is not None else None
+    factor, flag = 1, cv2.IMREAD_COLOR
+    if size:
+        _, target_size = fit_to_input(*size, preprocessing["input_size"], preprocessing["letterbox"])
+        factor, flag = reduction_factor(*size, target_size)
+    img = cv2.imdecode(buffer, flag)
+    if img is None:
+        raise InvalidImageError("Unable to process image")
+    decoded_size = img.shape[1::-1]
+    if factor == 1:
+        return img, decoded_size
+    width, height = size
+    if decoded_size != (-(-width // factor), -(-height // factor)):
+        # EXIF orientation rotated the image by 90 degrees while decoding.
+        width, height = height, width
+    return img, (width, height)
+
+
+def raw_frame(data, frame_format, width, height, stride=None):
+    """View an uncompressed frame as a BGR image.
+
+    BGR frames are wrapped without copying; ``stride`` is the number of bytes
+    per row (including any padding) and defaults to a tightly packed frame.
+    NV12 frames (a full-resolution Y plane followed by an interleaved
+    half-resolution UV plane, both with the same stride) need one color
+    conversion.
+    """
+    if frame_format not in RAW_FORMATS:
+        raise InvalidImageError(f"Unsupported frame format {frame_format!r}, expected one of {list(RAW_FORMATS)}")
+    if width <= 0 or height <= 0:
+        raise InvalidImageError("Frame width and height must be positive")
+    row_bytes = width * 3 if frame_format == "bgr" else width
+    stride = stride or row_bytes
+    rows = height if frame_format == "bgr" else height * 3 // 2
+    if frame_format == "nv12" and (width % 2 or height % 2):
+        raise InvalidImageError("NV12 frames must have an even width and height")
+    if stride < row_bytes or len(data) < stride * (rows - 1) + row_bytes:
+        raise InvalidImageError(f"Frame data is too short for a {width}x{height} {frame_format} frame")
+
+    if frame_format == "bgr":
+        return np.ndarray((height, width, 3), dtype=np.uint8, buffer=data, strides=(stride, 3, 1))
+    planes = np.ndarray((rows, width), dtype=np.uint8, buffer=data, strides=(stride, 1))
+    return cv2.cvtColor(planes, cv2.COLOR_YUV2BGR_NV12)
+
+
+def scale_boxes(boxes, from_size, to_size):
+    """Map xyxy ``boxes`` found on an image of ``from_size`` onto one of ``to_size``."""
+    if from_size == to_size or len(boxes) == 0:
+        return boxes
+    scale = np.array([to_size[0] / from_size[0], to_size[1] / from_size[1]] * 2, dtype=np.float32)
+    return np.rint(boxes * scale).astype(np.int32)
+
+
+def preview_gray(data, raw_layout=None, size=(128, 72)):
+    """A small grayscale version of a frame for change detection, made as cheaply as possible.
+
+    JPEGs are decoded at 1/8 scale straight to grayscale, NV12 frames use
+    their Y plane as is, and BGR frames are shrunk before the color conversion.
+    """
+    if raw_layout is None:
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            raise InvalidImageError("Unable to process image")
+        return gray
+    frame_format, width, height, stride = raw_layout
+    if frame_format == "nv12":
+        stride = stride or width
+        if len(data) < stride * (height - 1) + width:
+            raise InvalidImageError(f"Frame data is too short for a {width}x{height} {frame_format} frame")
+        return np.ndarray((height, width), dtype=np.uint8, buffer=data, strides=(stride, 1))
+    frame = raw_frame(data, frame_format, width, height, stride)
+    return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
@@ -0,0 +1,152 @@
+import bisect
+import threading
+
+# 默认直方图桶（秒），覆盖从解码到完整请求的耗时范围
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(labelnames, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # collect() returns {label_values_tuple: value} read at scrape time, for
+        # values that are already tracked elsewhere and cost nothing to expose.
+        self.collect = collect
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def snapshot(self):
+        with self._lock:
+            series = dict(self._series)
+        if self.collect is not None:
+            series.update(self.collect())
+        return series
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}_total{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.snapshot().items()
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._series[labels] = value
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.snapshot().items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = self.header()
+        labelnames = self.labelnames + ("le",)
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labelnames, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "detect_requests", "Detection requests by endpoint, model and status.", ("endpoint", "model", "status")
+))
+REQUEST_LATENCY = registry.register(Histogram(
+    "detect_request_seconds", "End-to-end detection latency per image.", ("endpoint", "model")
+))
+STAGE_LATENCY = registry.register(Histogram(
+    "detect_stage_seconds",
+    "Time per pipeline stage: read, decode, queue, preprocess, forward, postprocess, serialize.",
+    ("model", "stage")
+))
+BATCH_SIZE = registry.register(Histogram(
+    "detect_batch_size", "Frames per forward pass.", ("model",), buckets=(1, 2, 4, 8, 16, 32, 64)
+))
+MODEL_LOAD_SECONDS = registry.register(Gauge(
+    "model_load_seconds", "Duration of the most recent load of each model.", ("model",)
+))
+MODEL_EVENTS = registry.register(Counter(
+    "model_registry_events", "Model loads and evictions.", ("model", "event")
+))
+STREAM_FRAMES = registry.register(Counter(
+    "stream_frames", "Video stream frames that were inferred or answered from the motion gate.", ("model", "result")
+))
+
+
+def observe_stages(model_name, timings):
+    for stage, seconds in timings.items():
+        STAGE_LATENCY.observe(seconds, model_name, stage)
+
+
+def server_timing(timings):
+    """Format stage timings as a ``Server-Timing`` header value (milliseconds)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.models.object_detection_model import MODEL_SPECS, weights_for
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_model_bytes(model_name, precision="fp32"):
+    """Approximate a loaded net's resident size by the size of its files on disk."""
+    spec = MODEL_SPECS[model_name]
+    try:
+        weights = weights_for(model_name, precision)
+    except FileNotFoundError:
+        weights = spec["weights"]
+    paths = [weights, spec.get("config")]
+    return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+
+class ModelRegistry:
+    """Loads models on first use and evicts the least recently used ones.
+
+    ``loader(model_name)`` is called in a thread and returns whatever the
+    router serves requests through (a ``BatchScheduler``); ``unloader`` is
+    awaited with that object on eviction. The budget is a model count and/or
+    an estimated byte size from ``sizer``; 0 disables either limit.
+
+    ``get`` takes a reference on the entry that the caller gives back with
+    ``release`` (or both through ``use``). Referenced or busy entries are
+    never evicted, so the budget can be exceeded briefly under load; it is
+    enforced again as references are released.
+    """
+
+    def __init__(self, loader, unloader, sizer=estimate_model_bytes,
+                 max_models=0, max_memory_bytes=0, event_history=100):
+        self.loader = loader
+        self.unloader = unloader
+        self.sizer = sizer
+        self.max_models = max_models
+        self.max_memory_bytes = max_memory_bytes
+        self.events = deque(maxlen=event_history)
+        self.listeners = []
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._locks = {}
+        self._refs = {}
+        self._warmup_task = None
+
+    def __contains__(self, model_name):
+        return model_name in self._entries
+
+    @property
+    def entries(self):
+        return dict(self._entries)
+
+    @property
+    def loaded_models(self):
+        return list(self._entries)
+
+    @property
+    def memory_bytes(self):
+        return sum(self._sizes.values())
+
+    def _emit(self, event, model_name, **details):
+        record = {"event": event, "model_name": model_name, "timestamp": time.time(), **details}
+        self.events.append(record)
+        logger.info("model %s: %s %s", event, model_name, details)
+        for listener in self.listeners:
+            listener(record)
+
+    async def get(self, model_name):
+        """Return the entry for ``model_name``, loading it if needed, and hold a reference to it."""
+        if model_name not in MODEL_SPECS:
+            raise KeyError(model_name)
+        entry = self._entries.get(model_name)
+        if entry is not None:
+            self._acquire(model_name)
+            return entry
+
+        lock = self._locks.setdefault(model_name, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(model_name)
+            if entry is not None:
+                self._acquire(model_name)
+                return entry
+            start = time.perf_counter()
+            entry = await run_in_threadpool(self.loader, model_name)
+            self._entries[model_name] = entry
+            self._sizes[model_name] = self.sizer(model_name)
+            self._acquire(model_name)
+            self._emit("load", model_name, seconds=time.perf_counter() - start,
+                       bytes=self._sizes[model_name])
+        await self._enforce_budget()
+        return entry
+
+    def _acquire(self, model_name):
+        # 查找与计数之间没有 await，引用计数为正的条目不会被并发淘汰
+        self._entries.move_to_end(model_name)
+        self._refs[model_name] = self._refs.get(model_name, 0) + 1
+
+    async def release(self, model_name):
+        """Give back a reference taken by ``get``."""
+        refs = self._refs.get(model_name, 0) - 1
+        if refs > 0:
+            self._refs[model_name] = refs
+            return
+        self._refs.pop(model_name, None)
+        if self._over_budget():
+            await self._enforce_budget()
+
+    @contextlib.asynccontextmanager
+    async def use(self, model_name):
+        entry = await self.get(model_name)
+        try:
+            yield entry
+        finally:
+            await self.release(model_name)
+
+    def _over_budget(self):
+        if self.max_models and len(self._entries) > self.max_models:
+            return True
+        return bool(self.max_memory_bytes) and self.memory_bytes > self.max_memory_bytes
+
+    async def _enforce_budget(self):
+        for model_name in list(self._entries):
+            if not self._over_budget():
+                break
+            entry = self._entries.get(model_name)
+            if entry is None or self._refs.get(model_name) or getattr(entry, "busy", False):
+                continue
+            await self.evict(model_name)
+
+    async def evict(self, model_name):
+        entry = self._entries.pop(model_name, None)
+        if entry is None:
+            return
+        size = self._sizes.pop(model_name, 0)
+        await self.unloader(entry)
+        self._emit("evict", model_name, bytes=size)
+
+    def warmup(self, model_names):
+        """Load ``model_names`` in the background without delaying startup."""
+        async def _warm():
+            for model_name in model_names:
+                try:
+                    async with self.use(model_name):
+                        pass
+                except Exception:
+                    logger.exception("Warm-up of %s failed", model_name)
+
+        if model_names:
+            self._warmup_task = asyncio.get_running_loop().create_task(_warm())
+
+    async def close(self):
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            self._warmup_task = None
+        for model_name in list(self._entries):
+            await self.evict(model_name)
@@ -0,0 +1,94 @@
+import itertools
+
+import cv2
+import numpy as np
+
+
+def box_iou(a, b):
+    """Pairwise IoU between xyxy boxes ``a`` (N, 4) and ``b`` (M, 4)."""
+    a = a.astype(np.float32)[:, None, :]
+    b = b.astype(np.float32)[None, :, :]
+    width = np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    height = np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    intersection = np.maximum(width, 0) * np.maximum(height, 0)
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+
+class MotionGate:
+    """Decides per frame whether a video stream needs a fresh inference.
+
+    Each frame is reduced to a small blurred grayscale thumbnail and compared
+    with the thumbnail of the last frame that was inferred (not the previous
+    frame, so slow changes still add up). Inference runs when more than
+    ``min_changed`` of the thumbnail's pixels moved by over ``pixel_delta``
+    grey levels, and at least every ``keyframe_interval`` frames regardless,
+    which bounds how stale reused detections can get.
+    """
+
+    def __init__(self, pixel_delta=25, min_changed=0.005, keyframe_interval=30, size=(128, 72)):
+        self.pixel_delta = pixel_delta
+        self.min_changed = min_changed
+        self.keyframe_interval = keyframe_interval
+        self.size = size
+        self.reference = None
+        self.skipped = 0
+
+    def thumbnail(self, gray):
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        # 模糊以抑制传感器噪声和 JPEG 压缩伪影造成的误触发
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def thumbnail_bgr(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (3, 3), 0)
+
+    def should_infer(self, thumbnail):
+        if self.reference is not None and self.skipped + 1 < self.keyframe_interval:
+            changed = np.count_nonzero(cv2.absdiff(thumbnail, self.reference) > self.pixel_delta)
+            if changed < self.min_changed * thumbnail.size:
+                self.skipped += 1
+                return False
+        self.reference = thumbnail
+        self.skipped = 0
+        return True
+
+
+class IoUTracker:
+    """Gives detections stable ids across inferences by greedy IoU association.
+
+    A detection inherits the id of the previous track of the same class it
+    overlaps most (above ``iou_threshold``); unmatched detections start new
+    tracks and tracks without a match end.
+    """
+
+    def __init__(self, iou_threshold=0.3):
+        self.iou_threshold = iou_threshold
+        self.boxes = np.empty((0, 4), dtype=np.int32)
+        self.class_ids = np.empty((0,), dtype=np.int32)
+        self.track_ids = np.empty((0,), dtype=np.int64)
+        self._next_id = itertools.count(1)
+
+    def update(self, boxes, class_ids):
+        track_ids = np.zeros(len(boxes), dtype=np.int64)
+        matched = np.zeros(len(boxes), dtype=bool)
+        if len(boxes) and len(self.boxes):
+            iou = box_iou(boxes, self.boxes)
+            iou[class_ids[:, None] != self.class_ids[None, :]] = 0
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                i, j = np.unravel_index(flat, iou.shape)
+                if iou[i, j] <= self.iou_threshold:
+                    break
+                if matched[i] or self.track_ids[j] == 0:
+                    continue
+                track_ids[i] = self.track_ids[j]
+                matched[i] = True
+                # 每条旧轨迹只能被匹配一次
+                self.track_ids[j] = 0
+        for i in np.flatnonzero(~matched):
+            track_ids[i] = next(self._next_id)
+        self.boxes = np.asarray(boxes, dtype=np.int32)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32)
+        self.track_ids = track_ids.copy()
+        return track_ids
@@ -0,0 +1,166 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def perceptual_hash(img):
+    """64-bit difference hash of a BGR image, stable under re-encoding and small noise."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class ResultCache:
+    """Detection results keyed by image content, model and thresholds.
+
+    Values are ``(boxes, confidences, class_ids, img_width, img_height)``.
+    The in-memory tier is an LRU bounded by ``max_entries``; if ``db_path`` is
+    given, entries are also written to a ``detection_cache`` SQLite table and
+    survive restarts. Every entry expires after ``ttl_seconds`` (0 keeps them
+    forever). With ``phash_distance`` >= 0, frames whose perceptual hash is
+    within that many bits of a cached frame of the same size reuse its result.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=300, db_path=None, phash_distance=-1):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.phash_distance = phash_distance
+        self.stats = {"hits": 0, "disk_hits": 0, "phash_hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._phashes = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if db_path:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS detection_cache ("
+                    "key TEXT PRIMARY KEY, expires REAL, width INTEGER, height INTEGER, "
+                    "boxes BLOB, confidences BLOB, class_ids BLOB)"
+                )
+                conn.execute("DELETE FROM detection_cache WHERE expires <= ?", (time.time(),))
+
+    @property
+    def has_disk(self):
+        return bool(self.db_path)
+
+    @property
+    def uses_phash(self):
+        return self.phash_distance >= 0
+
+    @staticmethod
+    def make_key(content, model_name, *params):
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        return ":".join([digest, model_name] + [str(param) for param in params])
+
+    @staticmethod
+    def scope_of(key):
+        # Everything but the content digest: near-duplicates only match within it.
+        return key.split(":", 1)[1]
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def _expiry(self):
+        return time.time() + self.ttl_seconds if self.ttl_seconds else float("inf")
+
+    def get(self, key):
+        """Look up the in-memory tier; cheap enough to call on the event loop."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.time():
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._phashes.pop(key, None)
+        return None
+
+    def get_from_disk(self, key):
+        row = self._connection().execute(
+            "SELECT expires, width, height, boxes, confidences, class_ids FROM detection_cache WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        expires, width, height, boxes, confidences, class_ids = row
+        value = (
+            np.frombuffer(boxes, dtype=np.int32).reshape(-1, 4),
+            np.frombuffer(confidences, dtype=np.float32),
+            np.frombuffer(class_ids, dtype=np.int32),
+            width,
+            height
+        )
+        self._put_memory(key, value, expires)
+        self._count("disk_hits")
+        return value
+
+    def get_similar(self, key, phash, img_width, img_height):
+        scope = self.scope_of(key)
+        with self._lock:
+            candidates = [
+                (candidate_key, candidate_hash) for candidate_key, candidate_hash in self._phashes.items()
+                if self.scope_of(candidate_key) == scope
+            ]
+            if candidates:
+                hashes = np.array([candidate_hash for _, candidate_hash in candidates], dtype=np.uint64)
+                distances = np.unpackbits((hashes ^ np.uint64(phash)).view(np.uint8)).reshape(len(hashes), 64).sum(axis=1)
+                for index in np.argsort(distances):
+                    if distances[index] > self.phash_distance:
+                        break
+                    entry = self._entries.get(candidates[index][0])
+                    if entry is not None and entry[0] > time.time() and entry[1][3:] == (img_width, img_height):
+                        self.stats["phash_hits"] += 1
+                        return entry[1]
+        return None
+
+    def put(self, key, value, phash=None):
+        expires = self._expiry()
+        self._put_memory(key, value, expires, phash)
+        if self.has_disk:
+            boxes, confidences, class_ids, width, height = value
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO detection_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, expires, width, height,
+                     np.ascontiguousarray(boxes, dtype=np.int32).tobytes(),
+                     np.ascontiguousarray(confidences, dtype=np.float32).tobytes(),
+                     np.ascontiguousarray(class_ids, dtype=np.int32).tobytes())
+                )
+
+    def _put_memory(self, key, value, expires, phash=None):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            if phash is not None:
+                self._phashes[key] = phash
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._phashes.pop(evicted, None)
+
+    def record_miss(self):
+        self._count("misses")
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            entries = len(self._entries)
+        lookups = sum(stats.values())
+        hits = lookups - stats["misses"]
+        return {**stats, "entries": entries, "hit_rate": hits / lookups if lookups else 0.0}
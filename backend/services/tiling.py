@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def tile_starts(length, tile_size, stride):
+    """Start offsets along one axis; the last tile is flush with the edge."""
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def tile_grid(img_width, img_height, tile_size, overlap):
+    """Return ``(x, y, width, height)`` for overlapping tiles covering the image."""
+    stride = max(1, int(round(tile_size * (1 - overlap))))
+    return [
+        (x, y, min(tile_size, img_width), min(tile_size, img_height))
+        for y in tile_starts(img_height, tile_size, stride)
+        for x in tile_starts(img_width, tile_size, stride)
+    ]
+
+
+def interior_edges(tile, img_width, img_height):
+    """Which sides of ``tile`` (left, top, right, bottom) lie inside the image."""
+    x, y, width, height = tile
+    return np.array([x > 0, y > 0, x + width < img_width, y + height < img_height])
+
+
+def cut_by_tile_edge(boxes, tile, img_width, img_height, margin=2):
+    """Flag tile-local boxes that touch a side of the tile shared with a neighbour.
+
+    Such boxes are likely an object cut in two by the tile boundary; the
+    overlapping neighbour (or the full-image pass) usually has it whole.
+    """
+    x, y, width, height = tile
+    touches = np.stack((
+        boxes[:, 0] <= margin,
+        boxes[:, 1] <= margin,
+        boxes[:, 2] >= width - margin,
+        boxes[:, 3] >= height - margin
+    ), axis=1)
+    return (touches & interior_edges(tile, img_width, img_height)).any(axis=1)
+
+
+def merge_detections(boxes, confidences, class_ids, cut, iou_threshold, containment_threshold=0.7):
+    """Greedy class-aware NMS over detections from several tiles and passes.
+
+    Boxes cut by a tile edge rank below whole boxes, and besides the usual IoU
+    test a cut box is also dropped when a kept box of the same class covers
+    ``containment_threshold`` of it, since a partial box and the whole object
+    have a low IoU. Returns the indices to keep.
+    """
+    if len(boxes) == 0:
+        return np.empty((0,), dtype=np.int64)
+    boxes = boxes.astype(np.float32)
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    order = np.lexsort((-confidences, cut))
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        candidates = ~suppressed & (class_ids == class_ids[i])
+        candidates[i] = False
+        if not candidates.any():
+            continue
+        others = np.flatnonzero(candidates)
+        width = np.minimum(boxes[i, 2], boxes[others, 2]) - np.maximum(boxes[i, 0], boxes[others, 0])
+        height = np.minimum(boxes[i, 3], boxes[others, 3]) - np.maximum(boxes[i, 1], boxes[others, 1])
+        intersection = np.maximum(width, 0) * np.maximum(height, 0)
+        iou = intersection / np.maximum(areas[i] + areas[others] - intersection, 1e-6)
+        covered = intersection / np.maximum(areas[others], 1e-6)
+        suppressed[others[(iou > iou_threshold) | (cut[others] & (covered > containment_threshold))]] = True
+    return np.array(keep, dtype=np.int64)
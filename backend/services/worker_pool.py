@@ -0,0 +1,236 @@
+import logging
+import multiprocessing as mp
+import queue
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from backend.models.object_detection_model import MODEL_SPECS, ObjectDetectionModel, preprocessing_of
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(model_name, shm_name, slot_bytes, num_threads, model_options, conn):
+    # Each worker owns its net, so neither OpenCV nor ONNX Runtime may spawn a
+    # thread per core in every process on top of the pool itself.
+    cv2.setNumThreads(num_threads)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        model = ObjectDetectionModel(model_name, intra_op_threads=num_threads, **model_options)
+    except Exception as e:
+        # Report load failures (missing weights, bad backend) instead of just dying.
+        conn.send(("error", repr(e)))
+        shm.close()
+        conn.close()
+        return
+    conn.send("ready")
+    try:
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            frames = []
+            for slot, shape, inline_frame in request:
+                if inline_frame is not None:
+                    frames.append(inline_frame)
+                else:
+                    frames.append(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes))
+            timings = {}
+            try:
+                results = model.detect_batch(frames, timings)
+            except Exception as e:
+                conn.send(("error", repr(e), None))
+            else:
+                conn.send(("ok", results, timings))
+            # Drop the views before the next request reuses the slots.
+            del frames
+    finally:
+        shm.close()
+        conn.close()
+
+
+class WorkerStartError(RuntimeError):
+    """Raised when an inference worker process cannot load its model."""
+
+
+class _Worker:
+    def __init__(self, ctx, model_name, num_slots, slot_bytes, num_threads, model_options):
+        self.ctx = ctx
+        self.model_name = model_name
+        self.slot_bytes = slot_bytes
+        self.num_slots = num_slots
+        self.num_threads = num_threads
+        self.model_options = model_options
+        self.dead = False
+        self.conn = None
+        self.process = None
+        self.shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_bytes)
+        try:
+            self.spawn()
+        except BaseException:
+            self.shm.close()
+            self.shm.unlink()
+            raise
+
+    def spawn(self):
+        # 共享内存块跨进程重启保留，新进程按名称重新挂载
+        self.conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(self.model_name, self.shm.name, self.slot_bytes, self.num_threads, self.model_options, child_conn),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.dead = False
+
+    def wait_ready(self):
+        try:
+            message = self.conn.recv()
+        except EOFError:
+            self.process.join(timeout=1)
+            raise WorkerStartError(
+                f"inference worker for {self.model_name} exited during startup (exit code {self.process.exitcode})"
+            )
+        if message != "ready":
+            raise WorkerStartError(f"inference worker for {self.model_name} failed to load the model: {message[1]}")
+
+    def respawn(self):
+        """Replace a dead worker process, keeping its shared memory slots."""
+        self._stop_process()
+        self.spawn()
+        self.wait_ready()
+
+    def run(self, frames, timings=None):
+        request = []
+        for slot, frame in enumerate(frames):
+            if slot < self.num_slots and frame.nbytes <= self.slot_bytes:
+                # Strided views (e.g. raw frames with row padding) are packed
+                # straight into the slot without an intermediate copy.
+                view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+                view[...] = frame
+                request.append((slot, frame.shape, None))
+            else:
+                # Oversized frames are rare enough to just pickle through the pipe.
+                frame = np.ascontiguousarray(frame, dtype=np.uint8)
+                request.append((None, frame.shape, frame))
+        try:
+            self.conn.send(request)
+            status, payload, worker_timings = self.conn.recv()
+        except (EOFError, OSError):
+            self.dead = True
+            raise RuntimeError(
+                f"inference worker for {self.model_name} died (exit code {self.process.exitcode})"
+            )
+        if status != "ok":
+            raise RuntimeError(f"inference worker error: {payload}")
+        if timings is not None:
+            timings.update(worker_timings)
+        return payload
+
+    def _stop_process(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+    def close(self):
+        self._stop_process()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferenceWorkerPool:
+    """A pool of processes that each hold their own ``cv2.dnn`` net.
+
+    Frames are copied once into a per-worker shared memory block split into
+    fixed-size slots, and only the slot index and shape travel over the pipe.
+    Results come back as the compact ``(boxes, confidences, class_ids)`` arrays
+    that ``ObjectDetectionModel.detect_batch`` returns. The pool exposes the
+    same ``model_name``/``class_names``/``detect_batch`` surface as the model,
+    so it can be handed straight to a ``BatchScheduler``; ``detect_batch``
+    blocks until a worker is free, so call it from up to ``num_workers`` threads.
+
+    A worker whose process dies is respawned before it takes another batch,
+    and dropped from the pool if it cannot be restarted. If a worker cannot
+    load the model at startup, the whole pool is torn down and
+    ``WorkerStartError`` is raised.
+    """
+
+    def __init__(self, model_name, num_workers=2, threads_per_worker=1,
+                 max_batch_size=8, max_frame_bytes=1920 * 1080 * 3,
+                 score_threshold=0.5, nms_threshold=0.45,
+                 backend="opencv", precision="fp32", inter_op_threads=0):
+        self.model_name = model_name
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.backend_name = backend
+        self.precision = precision
+        self.class_names = MODEL_SPECS[model_name]["class_names"]
+        self.preprocessing = preprocessing_of(model_name)
+        self.num_workers = num_workers
+        ctx = mp.get_context("spawn")
+        model_options = {
+            "score_threshold": score_threshold,
+            "nms_threshold": nms_threshold,
+            "backend": backend,
+            "precision": precision,
+            "inter_op_threads": inter_op_threads
+        }
+        self._workers = []
+        try:
+            for _ in range(num_workers):
+                self._workers.append(
+                    _Worker(ctx, model_name, max_batch_size, max_frame_bytes, threads_per_worker, model_options)
+                )
+            for worker in self._workers:
+                worker.wait_ready()
+        except BaseException:
+            # 启动失败时释放已创建的进程和共享内存，否则每次重试都会泄漏 /dev/shm
+            self.close()
+            raise
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def detect_objects(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, timings=None):
+        worker = self._idle.get()
+        if worker is None:
+            # Every worker is gone; wake the next waiter too.
+            self._idle.put(None)
+            raise RuntimeError(f"no inference workers left for {self.model_name}")
+        try:
+            return worker.run(frames, timings)
+        finally:
+            self._release(worker)
+
+    def _release(self, worker):
+        if worker.dead:
+            try:
+                worker.respawn()
+                logger.warning("Respawned inference worker for %s", self.model_name)
+            except Exception:
+                logger.exception("Could not respawn inference worker for %s; dropping it", self.model_name)
+                self._workers.remove(worker)
+                worker.close()
+                if not self._workers:
+                    self._idle.put(None)
+                return
+        self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            try:
+                worker.close()
+            except Exception:
+                logger.exception("Failed to close inference worker for %s", self.model_name)
+        self._workers = []
@@ -0,0 +1,130 @@
+"""Microbenchmarks for ObjectDetectionModel, split into preprocess, forward and postprocess.
+
+Run from the repository root so the model paths resolve:
+
+    python -m benchmarks.bench_model --models SSD YOLOv8 --batch-sizes 1 4 --output bench_model.json
+
+Models whose weights are missing are reported as skipped. The ``decode``
+section times the output decoders on synthetic network outputs, so it runs
+even without any weights.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from backend.models.object_detection_model import (
+    MODEL_SPECS, ObjectDetectionModel, decode_ssd_output, decode_yolo_output, fit_to_input
+)
+from benchmarks.common import environment, load_images, summarize, write_report
+
+
+def bench_model(model_name, images, batch_size, iterations, warmup):
+    try:
+        model = ObjectDetectionModel(model_name=model_name)
+    except cv2.error as e:
+        return {"skipped": f"could not load model: {str(e).strip()}"}
+
+    stages = {"preprocess": [], "forward": [], "postprocess": [], "total": []}
+    for i in range(warmup + iterations):
+        frames = [images[(i * batch_size + j) % len(images)] for j in range(batch_size)]
+        start = time.perf_counter()
+        blob, transforms = model.preprocess(frames)
+        preprocessed = time.perf_counter()
+        output = model.forward(blob)
+        forwarded = time.perf_counter()
+        model.postprocess(output, transforms)
+        end = time.perf_counter()
+        if i < warmup:
+            continue
+        stages["preprocess"].append(preprocessed - start)
+        stages["forward"].append(forwarded - preprocessed)
+        stages["postprocess"].append(end - forwarded)
+        stages["total"].append(end - start)
+
+    result = {name: summarize(samples) for name, samples in stages.items()}
+    result["images_per_second"] = batch_size * iterations / sum(stages["total"])
+    return result
+
+
+def synthetic_yolo_output(family, num_candidates=8, seed=0):
+    """A raw YOLO head at 640x640 with mostly background rows and a few real candidates."""
+    rng = np.random.default_rng(seed)
+    if family == "yolov5":
+        output = rng.random((25200, 85), dtype=np.float32) * 0.05
+        output[:, :4] = rng.random((25200, 4), dtype=np.float32) * 640
+        rows = rng.choice(25200, num_candidates, replace=False)
+        output[rows, 4] = 0.9
+        output[rows, 5 + rng.integers(0, 80, num_candidates)] = 0.9
+        return output
+    output = rng.random((84, 8400), dtype=np.float32) * 0.05
+    output[:4] = rng.random((4, 8400), dtype=np.float32) * 640
+    columns = rng.choice(8400, num_candidates, replace=False)
+    output[4 + rng.integers(0, 80, num_candidates), columns] = 0.9
+    return output
+
+
+def bench_decoders(iterations):
+    outputs = {
+        "yolov5": synthetic_yolo_output("yolov5"),
+        "yolov8": synthetic_yolo_output("yolov8")
+    }
+    ssd_output = np.zeros((100, 7), dtype=np.float32)
+    ssd_output[:10, 1:3] = [[15, 0.9]] * 10
+    ssd_output[:, 3:7] = [0.1, 0.1, 0.5, 0.5]
+
+    ssd_transform, _ = fit_to_input(1280, 720, (300, 300))
+    yolo_transform, _ = fit_to_input(1280, 720, (640, 640), letterbox=True)
+    results = {}
+    for family, output in outputs.items():
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            decode_yolo_output(output, yolo_transform, has_objectness=family == "yolov5")
+            samples.append(time.perf_counter() - start)
+        results[family] = summarize(samples)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        decode_ssd_output(ssd_output, ssd_transform)
+        samples.append(time.perf_counter() - start)
+    results["ssd"] = summarize(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=list(MODEL_SPECS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--images", default="fixtures",
+                        help="'fixtures' (bundled sample images), 'synthetic', or a directory of images")
+    parser.add_argument("--width", type=int, default=1280, help="synthetic image width")
+    parser.add_argument("--height", type=int, default=720, help="synthetic image height")
+    parser.add_argument("--threads", type=int, default=None, help="cv2.setNumThreads before running")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    images = load_images(args.images, args.width, args.height)
+
+    report = {
+        "benchmark": "model",
+        "environment": environment(),
+        "config": vars(args),
+        "decode": bench_decoders(max(args.iterations, 100)),
+        "models": {}
+    }
+    for model_name in args.models:
+        report["models"][model_name] = {
+            str(batch_size): bench_model(model_name, images, batch_size, args.iterations, args.warmup)
+            for batch_size in args.batch_sizes
+        }
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
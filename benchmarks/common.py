@@ -0,0 +1,83 @@
+import glob
+import json
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend", "models")
+
+
+def synthetic_image(width, height, seed=0):
+    """A cluttered BGR frame (gradient, shapes, noise) that compresses like a real photo."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    img = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                    np.full((height, width), 128, np.float32)], axis=2).astype(np.uint8)
+    for _ in range(12):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        x1, y1 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        x2, y2 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        if rng.random() < 0.5:
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, -1)
+        else:
+            cv2.circle(img, (x1, y1), int(rng.integers(5, max(6, min(width, height) // 4))), color, -1)
+    noise = rng.normal(0, 6, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+def load_images(source="fixtures", width=1280, height=720, count=8):
+    """Decoded BGR images from the bundled fixtures, a directory, or ``synthetic``."""
+    if source == "synthetic":
+        return [synthetic_image(width, height, seed) for seed in range(count)]
+    directory = FIXTURE_DIR if source == "fixtures" else source
+    paths = sorted(
+        path for pattern in ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+        for path in glob.glob(os.path.join(directory, pattern))
+    )
+    images = [img for img in (cv2.imread(path) for path in paths) if img is not None]
+    return images or [synthetic_image(width, height, seed) for seed in range(count)]
+
+
+def encode_images(images, quality=90):
+    return [cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes() for img in images]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(ms.max())
+    }
+
+
+def environment():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "numpy": np.__version__
+    }
+
+
+def write_report(report, output):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
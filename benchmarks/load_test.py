@@ -0,0 +1,177 @@
+"""Closed-loop load generator for the detection API.
+
+Each of ``--concurrency`` workers sends a request, waits for the answer and
+sends the next one, until ``--requests`` requests (or ``--duration`` seconds)
+are done. Start the backend first, then e.g.:
+
+    python -m benchmarks.load_test --endpoint detect --model SSD --concurrency 16 --requests 2000
+    python -m benchmarks.load_test --endpoint batch --batch-size 32 --concurrency 2 --duration 30
+    python -m benchmarks.load_test --endpoint ws --concurrency 8 --duration 30 --output load_ws.json
+
+Every payload gets a unique 8-byte suffix after the JPEG end marker, which
+decoders ignore, so the exact-match result cache cannot serve repeats; pass
+``--allow-cache-hits`` to measure the cache instead.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import ssl
+import struct
+import time
+from collections import Counter
+
+import httpx
+import websockets
+
+from benchmarks.common import encode_images, environment, load_images, summarize, write_report
+
+
+class LoadRun:
+    def __init__(self, args, payloads):
+        self.args = args
+        self.payloads = payloads
+        self.latencies = []
+        self.statuses = Counter()
+        self.images = 0
+        self._counter = itertools.count()
+        self._deadline = None
+
+    def next_payload(self):
+        """Return a request index and its JPEG bytes, or ``None`` when the run is over."""
+        index = next(self._counter)
+        if self.args.requests and index >= self.args.requests:
+            return None
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            return None
+        data = self.payloads[index % len(self.payloads)]
+        if not self.args.allow_cache_hits:
+            data += struct.pack("<Q", index)
+        return index, data
+
+    def record(self, started, status, images=1):
+        self.latencies.append(time.perf_counter() - started)
+        self.statuses[status] += 1
+        if status == 200:
+            self.images += images
+
+    async def run(self, worker):
+        if self.args.duration:
+            self._deadline = time.monotonic() + self.args.duration
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(self) for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - start
+        requests = sum(self.statuses.values())
+        return {
+            "requests": requests,
+            "elapsed_seconds": elapsed,
+            "requests_per_second": requests / elapsed if elapsed else 0.0,
+            "images_per_second": self.images / elapsed if elapsed else 0.0,
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "latency": summarize(self.latencies)
+        }
+
+
+def http_worker(client, args):
+    async def worker(run):
+        while (item := run.next_payload()) is not None:
+            index, data = item
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    f"{args.url}/detect/", params={"model_name": args.model},
+                    files={"file": (f"{index}.jpg", data, "image/jpeg")}
+                )
+                run.record(started, response.status_code)
+            except httpx.HTTPError as e:
+                run.record(started, type(e).__name__)
+    return worker
+
+
+def batch_worker(client, args):
+    async def worker(run):
+        while True:
+            items = [item for item in (run.next_payload() for _ in range(args.batch_size)) if item is not None]
+            if not items:
+                return
+            files = [("files", (f"{index}.jpg", data, "image/jpeg")) for index, data in items]
+            started = time.perf_counter()
+            try:
+                images = 0
+                async with client.stream("POST", f"{args.url}/detect/batch",
+                                         params={"model_name": args.model}, files=files) as response:
+                    async for line in response.aiter_lines():
+                        if line and "detections" in json.loads(line):
+                            images += 1
+                run.record(started, response.status_code, images)
+            except httpx.HTTPError as e:
+                run.record(started, type(e).__name__, 0)
+    return worker
+
+
+def ws_worker(args, ssl_context):
+    url = args.url.replace("https://", "wss://").replace("http://", "ws://")
+
+    async def worker(run):
+        async with websockets.connect(f"{url}/ws/detect?model_name={args.model}",
+                                      ssl=ssl_context, max_size=None) as ws:
+            while (item := run.next_payload()) is not None:
+                index, data = item
+                started = time.perf_counter()
+                await ws.send(struct.pack("<I", index & 0xFFFFFFFF) + data)
+                result = json.loads(await ws.recv())
+                run.record(started, 200 if "detections" in result else "error")
+    return worker
+
+
+async def main_async(args):
+    images = load_images(args.images, args.width, args.height)
+    run = LoadRun(args, encode_images(images, args.quality))
+    ssl_context = None
+    if args.url.startswith("https://"):
+        ssl_context = ssl.create_default_context()
+        if not args.verify_tls:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+    if args.endpoint == "ws":
+        return await run.run(ws_worker(args, ssl_context))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(verify=ssl_context or True, timeout=args.timeout, limits=limits) as client:
+        worker = batch_worker(client, args) if args.endpoint == "batch" else http_worker(client, args)
+        return await run.run(worker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="https://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["detect", "batch", "ws"], default="detect")
+    parser.add_argument("--model", default="SSD")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="total requests (0 for no limit)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds (0 for no limit)")
+    parser.add_argument("--batch-size", type=int, default=16, help="images per /detect/batch request")
+    parser.add_argument("--images", default="fixtures",
+                        help="'fixtures' (bundled sample images), 'synthetic', or a directory of images")
+    parser.add_argument("--width", type=int, default=1280, help="synthetic image width")
+    parser.add_argument("--height", type=int, default=720, help="synthetic image height")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality of the uploaded images")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--verify-tls", action="store_true",
+                        help="verify the server certificate (off by default: the bundled one is self-signed)")
+    parser.add_argument("--allow-cache-hits", action="store_true")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("set --requests or --duration")
+
+    write_report({
+        "benchmark": "load",
+        "environment": environment(),
+        "config": vars(args),
+        "results": asyncio.run(main_async(args))
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
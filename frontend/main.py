@@ -1,22 +1,315 @@
 import sys
 import cv2
 import numpy as np
-import requests
+import httpx
 import threading
 import datetime
 import time
+import json
+import ssl
+import struct
+from collections import Counter, deque
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QTableWidget,
-    QTableWidgetItem, QComboBox, QPushButton, QSlider, QFormLayout, QLabel, QFileDialog
+    QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QTableWidget, QTableView,
+    QTableWidgetItem, QComboBox, QPushButton, QSlider, QFormLayout, QLabel, QFileDialog, QProgressDialog
 )
 from PySide6.QtGui import QImage, QPixmap
-from PySide6.QtCore import QTimer, Qt
+from PySide6.QtCore import QTimer, Qt, QObject, Signal, QAbstractTableModel, QModelIndex
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import urllib3
+from websockets.sync.client import connect
 
-# Disable InsecureRequestWarning
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+WS_URL = "wss://127.0.0.1:8000/ws/detect"
+BATCH_URL = "https://127.0.0.1:8000/detect/batch"
+MAX_IN_FLIGHT = 2  # 最多允许未返回结果的帧数
+HISTORY_LIMIT = 500  # 历史表最多保留的行数
+STATS_INTERVAL_MS = 500  # 统计表和柱状图的刷新间隔
+JPEG_QUALITY = 80
+
+
+def create_http_client():
+    """One keep-alive connection pool shared by all HTTP requests of the client.
+
+    HTTP/2 needs the optional h2 package (``pip install httpx[http2]``);
+    without it the pool falls back to HTTP/1.1 keep-alive.
+    """
+    limits = httpx.Limits(max_connections=4, max_keepalive_connections=4)
+    try:
+        return httpx.Client(http2=True, verify=False, timeout=None, limits=limits)
+    except ImportError:
+        return httpx.Client(verify=False, timeout=None, limits=limits)
+
+
+class FrameGrabber(QObject):
+    """The only reader of the camera.
+
+    A capture thread keeps the newest frame in a latest-frame-wins slot; the
+    GUI and the detection sender both take frames from here, so neither
+    steals frames from the other. ``frame_ready`` fires at most once until
+    the GUI has taken the frame, so a busy GUI thread skips frames instead of
+    queueing signals.
+    """
+
+    frame_ready = Signal()
+
+    def __init__(self, device=0, width=640, height=480):
+        super().__init__()
+        self.cap = cv2.VideoCapture(device)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self._condition = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._display_pending = False
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join(timeout=1)
+        self.cap.release()
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            with self._condition:
+                self._frame = frame
+                self._seq += 1
+                notify_gui = not self._display_pending
+                self._display_pending = True
+                self._condition.notify_all()
+            if notify_gui:
+                self.frame_ready.emit()
+
+    def take_for_display(self):
+        with self._condition:
+            self._display_pending = False
+            return self._seq, self._frame
+
+    def wait_for_frame(self, after_seq, timeout=1.0):
+        """Return ``(seq, frame)`` of the first frame newer than ``after_seq``, or ``None`` on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._seq > after_seq, timeout=timeout):
+                return None
+            return self._seq, self._frame
+
+
+class DetectionClient(QObject):
+    """Streams camera frames to ``/ws/detect`` on background threads.
+
+    A sender thread encodes the newest frame and keeps up to
+    ``MAX_IN_FLIGHT`` frames pipelined on the WebSocket while a receiver
+    thread reads results. Results reach the GUI only through the
+    ``detections_ready`` signal, never by touching widgets from these threads.
+    """
+
+    detections_ready = Signal(list)
+
+    def __init__(self, grabber, model_name):
+        super().__init__()
+        self.grabber = grabber
+        self.model_name = model_name
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def run(self):
+        # 自签名证书，与 httpx 的 verify=False 保持一致；ssl= 参数需要 websockets>=14
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        while True:
+            try:
+                with connect(f"{WS_URL}?model_name={self.model_name}", ssl=ssl_context, max_size=None) as ws:
+                    self.stream_frames(ws)
+            except Exception as e:
+                print(f"Error in detection stream: {e}")
+                time.sleep(1)
+
+    def stream_frames(self, ws):
+        """Send frames over the WebSocket while a second thread reads results back."""
+        state = {"received": -1, "closed": False}
+        condition = threading.Condition()
+
+        def receive_results():
+            try:
+                for message in ws:
+                    result = json.loads(message)
+                    with condition:
+                        # Results can arrive out of order; only keep the newest.
+                        if result["seq"] > state["received"]:
+                            state["received"] = result["seq"]
+                            if "detections" in result:
+                                self.detections_ready.emit(result["detections"])
+                            elif "error" in result:
+                                print(f"Error: {result['error']}")
+                        condition.notify()
+            finally:
+                with condition:
+                    state["closed"] = True
+                    condition.notify()
+
+        threading.Thread(target=receive_results, daemon=True).start()
+        model_name = self.model_name
+        seq = 0
+        frame_seq = 0
+        while True:
+            with condition:
+                # 服务端会丢弃积压的旧帧，因此以最新结果的序号衡量积压量
+                condition.wait_for(lambda: state["closed"] or seq - state["received"] <= MAX_IN_FLIGHT, timeout=1)
+                if state["closed"]:
+                    return
+            if model_name != self.model_name:
+                model_name = self.model_name
+                ws.send(json.dumps({"model_name": model_name}))
+            latest = self.grabber.wait_for_frame(frame_seq)
+            if latest is None:
+                continue
+            frame_seq, frame = latest
+            _, img_encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            ws.send(struct.pack("<I", seq) + img_encoded.tobytes())
+            seq += 1
+
+
+class BatchCancelled(Exception):
+    """Raised inside the upload when the user cancels a batch."""
+
+
+class LazyUpload:
+    """An image file that is opened only while httpx streams it into the request body.
+
+    Opening every selected file up front runs into the per-process file
+    descriptor limit with thousands of images; this way at most one is open
+    at a time. Reads also check for cancellation so Cancel can abort the
+    upload itself, not just the reading of results.
+    """
+
+    def __init__(self, path, cancelled):
+        self.path = path
+        self.cancelled = cancelled
+        self._handle = None
+        self._done = False
+
+    def read(self, size=-1):
+        if self.cancelled.is_set():
+            raise BatchCancelled()
+        if self._handle is None:
+            if self._done:
+                return b""
+            self._handle = open(self.path, "rb")
+        chunk = self._handle.read(size)
+        if not chunk:
+            self.close()
+            self._done = True
+        return chunk
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class BatchDetectionTask(QObject):
+    """Runs one /detect/batch upload on a background thread.
+
+    Progress and results reach the GUI through signals, so the camera view
+    keeps updating while the batch is uploaded and detected.
+    """
+
+    progress = Signal(int)
+    finished = Signal(dict)
+    failed = Signal(str)
+
+    def __init__(self, http, file_paths, model_name):
+        super().__init__()
+        self.http = http
+        self.file_paths = file_paths
+        self.model_name = model_name
+        self.cancelled = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        uploads = [LazyUpload(file_path, self.cancelled) for file_path in self.file_paths]
+        files = [("files", (file_path, upload)) for file_path, upload in zip(self.file_paths, uploads)]
+        results = {}
+        done = 0
+        try:
+            with self.http.stream("POST", f"{BATCH_URL}?model_name={self.model_name}", files=files) as response:
+                if response.status_code != 200:
+                    response.read()
+                    self.failed.emit(f"Error: {response.status_code} - {response.text}")
+                    return
+                for line in response.iter_lines():
+                    if self.cancelled.is_set():
+                        return
+                    if not line:
+                        continue
+                    result = json.loads(line)
+                    if "index" not in result:
+                        continue
+                    if "error" in result:
+                        print(f"Error processing file {self.file_paths[result['index']]}: {result['error']}")
+                    else:
+                        results[result["index"]] = result["detections"]
+                    done += 1
+                    self.progress.emit(done)
+        except BatchCancelled:
+            return
+        except Exception as e:
+            self.failed.emit(f"Error sending batch request: {e}")
+            return
+        finally:
+            for upload in uploads:
+                upload.close()
+        self.finished.emit(results)
+
+
+class DetectionHistoryModel(QAbstractTableModel):
+    """Detection history capped at ``limit`` rows; the oldest rows drop off."""
+
+    HEADERS = ("Time", "Objects", "Count")
+
+    def __init__(self, limit=HISTORY_LIMIT):
+        super().__init__()
+        self.rows = deque(maxlen=limit)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return str(self.rows[index.row()][index.column()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def append(self, row):
+        # 只通知增删的行，视图无需重建整张表
+        if len(self.rows) == self.rows.maxlen:
+            self.beginRemoveRows(QModelIndex(), 0, 0)
+            self.rows.popleft()
+            self.endRemoveRows()
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows))
+        self.rows.append(row)
+        self.endInsertRows()
 
 
 class VideoStreamWidget(QWidget):
@@ -28,7 +321,8 @@ class VideoStreamWidget(QWidget):
         self.table_widget = QTableWidget()
         self.figure = Figure()
         self.canvas = FigureCanvas(self.figure)
-        self.history_table = QTableWidget()
+        self.history_model = DetectionHistoryModel()
+        self.history_table = QTableView()
         self.model_selector = QComboBox()
         self.confidence_slider = QSlider(Qt.Horizontal)
         self.load_model_button = QPushButton("Load Model")
@@ -37,16 +331,23 @@ class VideoStreamWidget(QWidget):
         self.confidence_threshold = 0.5
         self.model_name = "SSD"
 
+        self.detection_results = []
+        self.stats_dirty = False
+        self.bar_classes = None
+        self.bars = None
+        self.http = create_http_client()
+        self.batch_task = None
+
         self.setup_ui()
+        self.setup_chart()
         self.setup_camera()
         self.setup_timers()
         self.prev_time = time.time()
+        self.frames_shown = 0
 
-        self.detection_results = []
-        self.detection_history = []
-
-        self.detection_thread = threading.Thread(target=self.detect_objects, daemon=True)
-        self.detection_thread.start()
+        self.detection_client = DetectionClient(self.grabber, self.model_name)
+        self.detection_client.detections_ready.connect(self.on_detections)
+        self.detection_client.start()
 
     def setup_ui(self):
         self.model_selector.addItems(["SSD", "YOLOv5", "YOLOv8"])
@@ -65,8 +366,7 @@ class VideoStreamWidget(QWidget):
         form_layout.addRow(self.load_model_button)
         form_layout.addRow(self.batch_load_button)
 
-        self.history_table.setColumnCount(3)
-        self.history_table.setHorizontalHeaderLabels(["Time", "Objects", "Count"])
+        self.history_table.setModel(self.history_model)
 
         self.table_widget.setColumnCount(2)
         self.table_widget.setHorizontalHeaderLabels(["Class", "Count"])
@@ -88,15 +388,26 @@ class VideoStreamWidget(QWidget):
 
         self.setLayout(main_layout)
 
+    def setup_chart(self):
+        self.ax = self.figure.add_subplot(111)
+        self.reset_chart()
+
+    def reset_chart(self):
+        self.ax.clear()
+        self.ax.set_xlabel('Class')
+        self.ax.set_ylabel('Count')
+        self.ax.set_title('Object Detection Statistics')
+
     def setup_camera(self):
-        self.cap = cv2.VideoCapture(0)  # Capture from the first camera
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        # 画面由采集线程按摄像头帧率推送，不再用定时器轮询
+        self.grabber = FrameGrabber(0)  # Capture from the first camera
+        self.grabber.frame_ready.connect(self.update_frame)
+        self.grabber.start()
 
     def setup_timers(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
-        self.timer.start(30)
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_statistics)
+        self.stats_timer.start(STATS_INTERVAL_MS)
 
         self.fps_timer = QTimer()
         self.fps_timer.timeout.connect(self.update_fps)
@@ -107,6 +418,7 @@ class VideoStreamWidget(QWidget):
 
     def load_model(self):
         self.model_name = self.model_selector.currentText()
+        self.detection_client.model_name = self.model_name
         # Add logic to notify the backend to load the selected model
         print(f"Loaded model: {self.model_name}")
 
@@ -116,20 +428,31 @@ class VideoStreamWidget(QWidget):
             self.batch_detect_objects(files)
 
     def batch_detect_objects(self, file_paths):
-        for file_path in file_paths:
-            try:
-                image = cv2.imread(file_path)
-                _, img_encoded = cv2.imencode('.jpg', image)
-                response = requests.post(f"https://127.0.0.1:8000/detect/?model_name={self.model_name}",
-                                         files={"file": img_encoded.tobytes()},
-                                         verify=False)
-                if response.status_code == 200:
-                    detection_results = response.json().get('detections', [])
-                    self.show_batch_detection_results(image, detection_results, file_path)
-                else:
-                    print(f"Error: {response.status_code} - {response.text}")
-            except Exception as e:
-                print(f"Error processing file {file_path}: {e}")
+        """Upload all images in one /detect/batch request and read NDJSON results as they stream in."""
+        progress = QProgressDialog("Detecting objects...", "Cancel", 0, len(file_paths), self)
+        progress.setWindowModality(Qt.WindowModal)
+        task = BatchDetectionTask(self.http, file_paths, self.model_name)
+        # 保持引用，避免任务对象在后台线程结束前被回收
+        self.batch_task = task
+        task.progress.connect(progress.setValue)
+        progress.canceled.connect(task.cancel)
+
+        def finish(results):
+            progress.close()
+            self.batch_task = None
+            for index, detection_results in sorted(results.items()):
+                image = cv2.imread(file_paths[index])
+                self.show_batch_detection_results(image, detection_results, file_paths[index])
+
+        def fail(message):
+            progress.close()
+            self.batch_task = None
+            print(message)
+
+        task.finished.connect(finish)
+        task.failed.connect(fail)
+        progress.show()
+        task.start()
 
     def show_batch_detection_results(self, image, detections, file_path):
         for detection in detections:
@@ -153,19 +476,22 @@ class VideoStreamWidget(QWidget):
         cv2.destroyAllWindows()
 
     def update_frame(self):
-        ret, frame = self.cap.read()
-        if ret:
-            frame = self.draw_detections(frame)
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = frame.shape
-            bytes_per_line = ch * w
-            qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            self.image_label.setPixmap(QPixmap.fromImage(qt_image))
-            self.update_statistics()
+        _, frame = self.grabber.take_for_display()
+        if frame is None:
+            return
+        # 采集帧与发送线程共享，画框前先复制
+        frame = self.draw_detections(frame.copy())
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w, ch = frame.shape
+        bytes_per_line = ch * w
+        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
+        self.image_label.setPixmap(QPixmap.fromImage(qt_image))
+        self.frames_shown += 1
 
     def update_fps(self):
         current_time = time.time()
-        fps = 1.0 / (current_time - self.prev_time)
+        fps = self.frames_shown / (current_time - self.prev_time)
+        self.frames_shown = 0
         self.prev_time = current_time
         self.fps_label.setText(f"FPS: {fps:.2f}")
 
@@ -188,31 +514,17 @@ class VideoStreamWidget(QWidget):
                 cv2.putText(frame, label, (box[0], box[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
         return frame
 
-    def detect_objects(self):
-        while True:
-            ret, frame = self.cap.read()
-            if ret:
-                _, img_encoded = cv2.imencode('.jpg', frame)
-                try:
-                    response = requests.post(f"https://127.0.0.1:8000/detect/?model_name={self.model_name}",
-                                             files={"file": img_encoded.tobytes()},
-                                             verify=False)
-                    if response.status_code == 200:
-                        self.detection_results = response.json().get('detections', [])
-                        self.update_history()
-                    else:
-                        print(f"Error: {response.status_code} - {response.text}")
-                except Exception as e:
-                    print(f"Error sending request: {e}")
+    def on_detections(self, detections):
+        self.detection_results = detections
+        self.update_history()
+        self.stats_dirty = True
 
     def update_statistics(self):
-        class_counts = {}
-        for detection in self.detection_results:
-            class_name = detection['class_name']
-            if class_name in class_counts:
-                class_counts[class_name] += 1
-            else:
-                class_counts[class_name] = 1
+        """Refresh the class table and chart on a timer, only when results changed."""
+        if not self.stats_dirty:
+            return
+        self.stats_dirty = False
+        class_counts = Counter(detection['class_name'] for detection in self.detection_results)
 
         self.table_widget.setRowCount(len(class_counts))
 
@@ -220,29 +532,29 @@ class VideoStreamWidget(QWidget):
             self.table_widget.setItem(row, 0, QTableWidgetItem(class_name))
             self.table_widget.setItem(row, 1, QTableWidgetItem(str(count)))
 
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        ax.bar(class_counts.keys(), class_counts.values())
-        ax.set_xlabel('Class')
-        ax.set_ylabel('Count')
-        ax.set_title('Object Detection Statistics')
-        self.canvas.draw()
+        classes = sorted(class_counts)
+        counts = [class_counts[class_name] for class_name in classes]
+        if classes == self.bar_classes:
+            # 类别不变时只改柱高，不重建坐标轴
+            for bar, count in zip(self.bars, counts):
+                bar.set_height(count)
+        else:
+            # 类别变化时分类坐标轴也要重建
+            self.reset_chart()
+            self.bars = self.ax.bar(classes, counts)
+            self.bar_classes = classes
+        self.ax.set_ylim(0, max(counts, default=0) + 1)
+        self.canvas.draw_idle()
 
     def update_history(self):
         current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         object_names = [d['class_name'] for d in self.detection_results]
         object_count = len(self.detection_results)
-
-        self.detection_history.append((current_time, ", ".join(object_names), object_count))
-        self.history_table.setRowCount(len(self.detection_history))
-
-        for row, (time, objects, count) in enumerate(self.detection_history):
-            self.history_table.setItem(row, 0, QTableWidgetItem(time))
-            self.history_table.setItem(row, 1, QTableWidgetItem(objects))
-            self.history_table.setItem(row, 2, QTableWidgetItem(str(count)))
+        self.history_model.append((current_time, ", ".join(object_names), object_count))
 
     def closeEvent(self, event):
-        self.cap.release()
+        self.grabber.stop()
+        self.http.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.routers.detection import status_of
+from backend.services.batching import BatchScheduler, QueueFullError, SchedulerClosedError
+
+
+class RecordingModel:
+    """Returns each frame as its own result and records the size of every batch."""
+
+    model_name = "fake"
+
+    def __init__(self, release=None):
+        self.batches = []
+        self.release = release
+
+    def detect_batch(self, frames, timings=None):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append(len(frames))
+        return list(frames)
+
+
+def test_concurrent_submits_share_batches():
+    model = RecordingModel()
+
+    async def main():
+        scheduler = BatchScheduler(model, max_batch_size=4, max_wait_ms=50)
+        try:
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(10)))
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(main()) == list(range(10))
+    assert model.batches == [4, 4, 2]
+
+
+def test_submit_many_keeps_frame_order_and_reports_timings():
+    model = RecordingModel()
+
+    async def main():
+        scheduler = BatchScheduler(model, max_batch_size=3, max_wait_ms=1, max_queue_size=2)
+        timings = {}
+        try:
+            # 帧数远超队列容量也不会触发 QueueFullError
+            return await scheduler.submit_many(list(range(20)), timings), timings
+        finally:
+            await scheduler.stop()
+
+    results, timings = asyncio.run(main())
+    assert results == list(range(20))
+    assert sum(model.batches) == 20 and max(model.batches) <= 3
+    assert "queue" not in timings
+
+
+def test_full_queue_raises_queue_full_and_maps_to_503():
+    release = threading.Event()
+    model = RecordingModel(release)
+
+    async def main():
+        scheduler = BatchScheduler(model, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+        pending = [asyncio.create_task(scheduler.submit("first"))]
+        # 等第一帧被取走并阻塞在推理线程中，随后两帧占满队列
+        while not scheduler.in_flight:
+            await asyncio.sleep(0.001)
+        pending += [asyncio.create_task(scheduler.submit(i)) for i in range(2)]
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 2
+        with pytest.raises(QueueFullError) as excinfo:
+            await scheduler.submit("overflow")
+        release.set()
+        results = await asyncio.gather(*pending)
+        await scheduler.stop()
+        return results, excinfo.value
+
+    results, error = asyncio.run(main())
+    assert results == ["first", 0, 1]
+    assert status_of(error) == 503
+
+
+def test_stopped_scheduler_rejects_submits():
+    async def main():
+        scheduler = BatchScheduler(RecordingModel())
+        await scheduler.submit(1)
+        await scheduler.stop()
+        with pytest.raises(SchedulerClosedError) as excinfo:
+            await scheduler.submit(2)
+        return excinfo.value
+
+    assert status_of(asyncio.run(main())) == 503
+
+
+def test_failed_batch_fails_every_request_in_it():
+    class BrokenModel(RecordingModel):
+        def detect_batch(self, frames, timings=None):
+            raise RuntimeError("forward failed")
+
+    async def main():
+        scheduler = BatchScheduler(BrokenModel(), max_batch_size=4, max_wait_ms=20)
+        try:
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(3)), return_exceptions=True)
+        finally:
+            await scheduler.stop()
+
+    errors = asyncio.run(main())
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert status_of(errors[0]) == 500
@@ -0,0 +1,45 @@
+import numpy as np
+
+from backend.services.encoding import DETECTIONS_HEADER, accepts_packed, clip_boxes, pack_detections, unpack_detections
+
+
+def test_packed_detections_round_trip():
+    boxes = np.array([[1, 2, 30, 40], [50, 60, 70, 80]], dtype=np.int32)
+    confidences = np.array([0.25, 0.875], dtype=np.float32)
+    class_ids = np.array([3, 17], dtype=np.int32)
+    data = pack_detections(boxes, confidences, class_ids, 640, 480)
+    assert len(data) == DETECTIONS_HEADER.size + 2 * (16 + 4 + 4)
+    unpacked_boxes, unpacked_confidences, unpacked_class_ids, width, height = unpack_detections(data)
+    np.testing.assert_array_equal(unpacked_boxes, boxes)
+    np.testing.assert_array_equal(unpacked_confidences, confidences)
+    np.testing.assert_array_equal(unpacked_class_ids, class_ids)
+    assert (width, height) == (640, 480)
+
+
+def test_packed_layout_is_little_endian_struct_of_arrays():
+    data = pack_detections(np.array([[1, 2, 3, 4]]), np.array([0.5]), np.array([7]), 10, 20)
+    assert data[:4] == b"DET1"
+    assert data[4:16] == (1).to_bytes(4, "little") + (10).to_bytes(4, "little") + (20).to_bytes(4, "little")
+    assert data[16:32] == b"".join(value.to_bytes(4, "little") for value in (1, 2, 3, 4))
+    assert data[32:36] == np.float32(0.5).astype("<f4").tobytes()
+    assert data[36:] == (7).to_bytes(4, "little")
+
+
+def test_empty_detections_round_trip():
+    data = pack_detections(np.empty((0, 4), dtype=np.int32), np.empty(0), np.empty(0), 5, 5)
+    boxes, confidences, class_ids, _, _ = unpack_detections(data)
+    assert boxes.shape == (0, 4) and len(confidences) == 0 and len(class_ids) == 0
+
+
+def test_clip_boxes_only_clips_sides_that_leave_the_image():
+    boxes = clip_boxes(np.array([[-5, -1, 700, 500], [10, 10, 20, 20]]), 640, 480)
+    np.testing.assert_array_equal(boxes, [[0, 0, 640, 480], [10, 10, 20, 20]])
+
+
+def test_accept_negotiation_defaults_to_json():
+    assert not accepts_packed(None)
+    assert not accepts_packed("*/*")
+    assert not accepts_packed("application/json")
+    assert not accepts_packed("application/x-detections;q=0.5, application/json")
+    assert accepts_packed("application/x-detections")
+    assert accepts_packed("application/json;q=0.5, application/x-detections")
@@ -0,0 +1,177 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+
+from backend import database
+from backend.database import Base, ClassStatistic, ClassStatisticRollup, DetectionHistory, ROLLUP_GRANULARITIES
+from backend.routers import history
+from backend.services.history_writer import HistoryWriter
+
+CLASS_NAMES = ["background", "person", "car", "dog"]
+T0 = datetime.datetime(2024, 5, 1, 23, 58, 30)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(history, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def write(engine, detections):
+    """Persist ``(timestamp, class_id, confidence)`` tuples through the writer, one image each."""
+    writer = HistoryWriter(engine, flush_interval=0.01)
+    writer.start()
+    for timestamp, class_id, confidence in detections:
+        writer.record("SSD", CLASS_NAMES, [class_id], [confidence], timestamp=timestamp)
+    writer.stop()
+    assert writer.stats["written"] == len(detections)
+
+
+def read_history(**kwargs):
+    params = dict(start=None, end=None, class_name=None, model_name=None, cursor=None, limit=100)
+    params.update(kwargs)
+    return history.read_history(**params)
+
+
+def read_statistics(granularity, top=None):
+    return history.read_statistics(granularity=granularity, start=None, end=None, class_name=None, top=top)
+
+
+def test_keyset_pagination_walks_rows_with_equal_timestamps(engine):
+    # 多张图片在同一时刻写入，游标必须靠 id 区分
+    write(engine, [(T0, 1 + i % 3, 0.5) for i in range(7)] + [(T0 - datetime.timedelta(seconds=1), 1, 0.5)] * 3)
+
+    ids, cursor = [], None
+    while True:
+        page = read_history(cursor=cursor, limit=3)
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    with engine.connect() as conn:
+        expected = conn.execute(
+            select(DetectionHistory.id).order_by(DetectionHistory.timestamp.desc(), DetectionHistory.id.desc())
+        ).scalars().all()
+    assert ids == expected
+    assert len(set(ids)) == 10
+
+
+def test_history_filters_by_class_and_time(engine):
+    write(engine, [(T0, 1, 0.9), (T0, 2, 0.8), (T0 + datetime.timedelta(minutes=5), 1, 0.7)])
+    page = read_history(class_name="person", end=T0 + datetime.timedelta(minutes=1))
+    assert [item["confidence"] for item in page["items"]] == [0.9]
+    assert page["next_cursor"] is None
+
+
+def test_invalid_cursor_is_a_400(engine):
+    with pytest.raises(history.HTTPException) as excinfo:
+        read_history(cursor="not-a-cursor")
+    assert excinfo.value.status_code == 400
+
+
+def test_rollups_accumulate_per_bucket(engine):
+    # 跨分钟、小时与日期边界，并分两次写入以覆盖 upsert 的累加
+    detections = [
+        (T0, 1, 0.5),
+        (T0 + datetime.timedelta(seconds=10), 1, 0.7),
+        (T0 + datetime.timedelta(seconds=40), 2, 0.9),
+        (T0 + datetime.timedelta(minutes=2), 1, 0.3),
+    ]
+    write(engine, detections[:2])
+    write(engine, detections[2:])
+
+    minute = {(b["bucket_start"], c["class_name"]): c["count"] for b in read_statistics("minute")["buckets"] for c in b["classes"]}
+    assert minute == {
+        ("2024-05-01T23:58:00", "person"): 2,
+        ("2024-05-01T23:59:00", "car"): 1,
+        ("2024-05-02T00:00:00", "person"): 1,
+    }
+    hours = read_statistics("hour")["buckets"]
+    assert [(b["bucket_start"], b["total"]) for b in hours] == [("2024-05-01T23:00:00", 3), ("2024-05-02T00:00:00", 1)]
+    person = next(c for c in hours[0]["classes"] if c["class_name"] == "person")
+    assert person["mean_confidence"] == pytest.approx(0.6)
+    assert [b["total"] for b in read_statistics("day")["buckets"]] == [3, 1]
+
+    with engine.connect() as conn:
+        totals = dict(conn.execute(select(ClassStatistic.class_name, ClassStatistic.count)).all())
+    assert totals == {"person": 3, "car": 1}
+
+
+def test_top_limits_classes_per_bucket(engine):
+    write(engine, [(T0, 1, 0.5)] * 3 + [(T0, 2, 0.5)] * 2 + [(T0, 3, 0.5)]
+          + [(T0 + datetime.timedelta(hours=1), 3, 0.5)] * 2 + [(T0 + datetime.timedelta(hours=1), 1, 0.5)])
+    buckets = read_statistics("hour", top=1)["buckets"]
+    assert [[c["class_name"] for c in b["classes"]] for b in buckets] == [["person"], ["dog"]]
+    # total 仍统计桶内的全部类别
+    assert [b["total"] for b in buckets] == [6, 3]
+
+
+def test_unknown_granularity_is_a_400(engine):
+    with pytest.raises(history.HTTPException) as excinfo:
+        read_statistics("week")
+    assert excinfo.value.status_code == 400
+
+
+def rollup_totals(conn, granularity):
+    table = ClassStatisticRollup.__table__
+    return dict(conn.execute(
+        select(table.c.class_name, func.sum(table.c.count)).where(table.c.granularity == granularity)
+        .group_by(table.c.class_name)
+    ).all())
+
+
+def test_rollup_totals_match_detection_history(engine):
+    write(engine, [(T0 + datetime.timedelta(seconds=37 * i), 1 + i % 3, 0.5) for i in range(200)])
+    with engine.connect() as conn:
+        expected = dict(conn.execute(
+            select(DetectionHistory.object_name, func.count()).group_by(DetectionHistory.object_name)
+        ).all())
+        for granularity in ROLLUP_GRANULARITIES:
+            assert rollup_totals(conn, granularity) == expected
+
+
+def test_legacy_table_is_moved_aside(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE detection_history (id INTEGER PRIMARY KEY, time DATETIME, objects VARCHAR, count INTEGER)")
+        conn.exec_driver_sql("CREATE INDEX ix_detection_history_time ON detection_history (time)")
+        conn.exec_driver_sql("INSERT INTO detection_history (time, objects, count) VALUES ('2024-05-01 10:00:00', 'person', 2)")
+
+    database.migrate_legacy_tables(engine)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT objects, count FROM detection_history_legacy").all() == [("person", 2)]
+        assert conn.execute(select(func.count()).select_from(DetectionHistory)).scalar() == 0
+    engine.dispose()
+
+
+def test_backfill_builds_rollups_from_existing_history(engine):
+    rows = [
+        {"timestamp": T0 + datetime.timedelta(seconds=45 * i), "model_name": "SSD",
+         "object_name": CLASS_NAMES[1 + i % 2], "confidence": 0.25, "image_path": None}
+        for i in range(10)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(DetectionHistory), rows)
+
+    database.backfill_rollups(engine)
+
+    with engine.connect() as conn:
+        for granularity in ROLLUP_GRANULARITIES:
+            assert rollup_totals(conn, granularity) == {"person": 5, "car": 5}
+    # 回填的桶与写入线程产生的桶必须是同一行，后续写入才会累加到同一桶上
+    write(engine, [(T0, 1, 0.25)])
+    minute = read_statistics("minute")["buckets"][0]
+    assert minute["bucket_start"] == "2024-05-01T23:58:00"
+    assert minute["classes"] == [{"class_name": "person", "count": 2, "mean_confidence": 0.25}]
+
+    # 已有汇总数据时不再重复回填
+    database.backfill_rollups(engine)
+    with engine.connect() as conn:
+        assert rollup_totals(conn, "day") == {"person": 6, "car": 5}
@@ -0,0 +1,149 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.models.object_detection_model import PREPROCESSING
+from backend.services.ingest import (
+    InvalidImageError, decode_image, jpeg_size, raw_frame, reduction_factor, scale_boxes
+)
+
+
+def encode_jpeg(img):
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    assert ok
+    return encoded.tobytes()
+
+
+def with_orientation(jpeg, orientation):
+    """Insert an EXIF APP1 segment carrying only an orientation tag right after SOI."""
+    tiff = b"II*\x00" + struct.pack("<I", 8) + struct.pack("<H", 1) \
+        + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack("<I", 0)
+    payload = b"Exif\x00\x00" + tiff
+    return jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload + jpeg[2:]
+
+
+def bright_box(img):
+    """The xyxy bounding box of the bright pixels in ``img``."""
+    ys, xs = np.nonzero(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) > 128)
+    return np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]], dtype=np.int32)
+
+
+def test_jpeg_size_reads_the_frame_header():
+    jpeg = encode_jpeg(np.zeros((123, 457, 3), np.uint8))
+    assert jpeg_size(jpeg) == (457, 123)
+    assert jpeg_size(with_orientation(jpeg, 6)) == (457, 123)
+
+
+def test_jpeg_size_rejects_other_data():
+    ok, png = cv2.imencode(".png", np.zeros((8, 8, 3), np.uint8))
+    assert jpeg_size(png.tobytes()) is None
+    assert jpeg_size(b"\xff\xd8\xff") is None
+    assert jpeg_size(b"") is None
+
+
+@pytest.mark.parametrize("size, target, factor", [
+    ((3840, 2160), (300, 300), 4),
+    ((3840, 2160), (640, 360), 4),
+    ((5120, 2880), (640, 360), 8),
+    ((1280, 720), (640, 360), 2),
+    ((640, 480), (640, 480), 1),
+    ((300, 300), (640, 640), 1),
+])
+def test_reduction_factor_never_goes_below_the_target(size, target, factor):
+    assert reduction_factor(*size, target)[0] == factor
+    assert size[0] // factor >= target[0] or factor == 1
+    assert size[1] // factor >= target[1] or factor == 1
+
+
+def test_4k_jpeg_is_decoded_reduced_and_boxes_map_back():
+    img = np.zeros((2160, 3840, 3), np.uint8)
+    cv2.rectangle(img, (1000, 400), (2599, 1599), (255, 255, 255), -1)
+    jpeg = encode_jpeg(img)
+
+    decoded, original_size = decode_image(jpeg, PREPROCESSING["ssd"])
+    assert decoded.shape[:2] == (540, 960)
+    assert original_size == (3840, 2160)
+
+    boxes = scale_boxes(bright_box(decoded), decoded.shape[1::-1], original_size)
+    assert boxes.dtype == np.int32
+    np.testing.assert_allclose(boxes, [[1000, 400, 2600, 1600]], atol=4)
+
+
+def test_decode_without_preprocessing_keeps_full_size():
+    jpeg = encode_jpeg(np.zeros((2160, 3840, 3), np.uint8))
+    decoded, original_size = decode_image(jpeg)
+    assert decoded.shape[:2] == (2160, 3840)
+    assert original_size == (3840, 2160)
+
+
+def test_exif_rotation_swaps_the_original_size():
+    img = np.zeros((1440, 2560, 3), np.uint8)
+    cv2.rectangle(img, (0, 0), (639, 359), (255, 255, 255), -1)
+    jpeg = with_orientation(encode_jpeg(img), 6)
+
+    decoded, original_size = decode_image(jpeg, PREPROCESSING["yolov8"])
+    # 解码器按 EXIF 旋转了 90 度，原图尺寸也必须随之交换
+    assert decoded.shape[:2] == (640, 360)
+    assert original_size == (1440, 2560)
+    full, _ = decode_image(jpeg)
+    assert full.shape[:2] == (2560, 1440)
+    boxes = scale_boxes(bright_box(decoded), decoded.shape[1::-1], original_size)
+    np.testing.assert_allclose(boxes, bright_box(full), atol=8)
+
+
+def test_undecodable_content_is_invalid():
+    with pytest.raises(InvalidImageError):
+        decode_image(b"\xff\xd8not really a jpeg", PREPROCESSING["ssd"])
+
+
+def test_strided_bgr_frame_is_a_view():
+    width, height, stride = 5, 3, 20
+    rows = np.arange(height * stride, dtype=np.uint8).reshape(height, stride)
+    data = bytearray(rows.tobytes()[:stride * (height - 1) + width * 3])
+
+    frame = raw_frame(data, "bgr", width, height, stride)
+    assert frame.shape == (height, width, 3)
+    np.testing.assert_array_equal(frame, rows[:, :width * 3].reshape(height, width, 3))
+    data[stride + 1] = 255
+    assert frame[1, 0, 1] == 255
+
+
+def test_nv12_frame_with_row_padding():
+    width, height, stride = 64, 48, 80
+    bgr = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    # OpenCV 只生成 I420，转成 NV12 后再给每行补齐到 stride
+    i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420).reshape(-1)
+    y = i420[:width * height].reshape(height, width)
+    u = i420[width * height:width * height * 5 // 4].reshape(height // 2, width // 2)
+    v = i420[width * height * 5 // 4:].reshape(height // 2, width // 2)
+    uv = np.stack([u, v], axis=-1).reshape(height // 2, width)
+    padded = np.zeros((height * 3 // 2, stride), np.uint8)
+    padded[:height, :width] = y
+    padded[height:, :width] = uv
+
+    frame = raw_frame(padded.tobytes(), "nv12", width, height, stride)
+    expected = cv2.cvtColor(np.vstack([y, uv]), cv2.COLOR_YUV2BGR_NV12)
+    np.testing.assert_array_equal(frame, expected)
+
+
+@pytest.mark.parametrize("data_size, frame_format, width, height, stride", [
+    (100, "rgb", 4, 4, None),
+    (100, "bgr", 0, 4, None),
+    (47, "bgr", 4, 4, None),
+    (100, "bgr", 4, 4, 8),
+    (23, "nv12", 4, 4, None),
+    (100, "nv12", 5, 4, None),
+    (100, "nv12", 4, 4, 20),
+])
+def test_raw_frame_validation(data_size, frame_format, width, height, stride):
+    with pytest.raises(InvalidImageError):
+        raw_frame(bytes(data_size), frame_format, width, height, stride)
+
+
+def test_scale_boxes_is_a_no_op_at_the_same_size():
+    boxes = np.array([[1, 2, 3, 4]], dtype=np.int32)
+    assert scale_boxes(boxes, (100, 50), (100, 50)) is boxes
+    assert len(scale_boxes(np.zeros((0, 4), np.int32), (100, 50), (400, 200))) == 0
+    np.testing.assert_array_equal(scale_boxes(boxes, (100, 50), (250, 100)), [[2, 4, 8, 8]])
@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+
+from backend.services.motion import IoUTracker, MotionGate, box_iou
+
+
+def gray_frame(seed=0, width=640, height=360):
+    rng = np.random.default_rng(seed)
+    return rng.integers(90, 110, (height, width), dtype=np.uint8)
+
+
+def boxes(*rows):
+    return np.array(rows, dtype=np.int32).reshape(-1, 4)
+
+
+def test_box_iou():
+    iou = box_iou(boxes([0, 0, 10, 10], [0, 0, 5, 10]), boxes([0, 0, 10, 10], [20, 20, 30, 30]))
+    np.testing.assert_allclose(iou, [[1.0, 0.0], [0.5, 0.0]])
+
+
+def test_static_frames_are_skipped_and_motion_is_inferred():
+    gate = MotionGate(keyframe_interval=100)
+    background = gray_frame()
+    assert gate.should_infer(gate.thumbnail(background))
+    # 传感器噪声不触发推理
+    for seed in range(1, 5):
+        noisy = cv2.add(background, gray_frame(seed) // 20)
+        assert not gate.should_infer(gate.thumbnail(noisy))
+
+    moved = background.copy()
+    cv2.rectangle(moved, (100, 100), (200, 200), 255, -1)
+    assert gate.should_infer(gate.thumbnail(moved))
+    assert not gate.should_infer(gate.thumbnail(moved))
+
+
+def test_slow_changes_accumulate_against_the_last_inferred_frame():
+    gate = MotionGate(keyframe_interval=100)
+    frame = np.full((360, 640), 100, np.uint8)
+    assert gate.should_infer(gate.thumbnail(frame))
+    decisions = []
+    for step in range(1, 10):
+        # 每帧只亮 10 级，低于 pixel_delta，但相对参考帧会累积
+        decisions.append(gate.should_infer(gate.thumbnail(frame + 10 * step)))
+    assert decisions.index(True) == 2
+
+
+def test_keyframe_interval_bounds_skipped_frames():
+    gate = MotionGate(keyframe_interval=5)
+    frame = gray_frame()
+    decisions = [gate.should_infer(gate.thumbnail(frame)) for _ in range(11)]
+    assert decisions == [True, False, False, False, False] * 2 + [True]
+
+
+def test_bgr_and_gray_thumbnails_agree():
+    gate = MotionGate()
+    gray = gray_frame()
+    bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    assert np.abs(gate.thumbnail(gray).astype(int) - gate.thumbnail_bgr(bgr)).max() <= 1
+
+
+def test_tracker_keeps_ids_for_overlapping_boxes_of_the_same_class():
+    tracker = IoUTracker()
+    first = tracker.update(boxes([0, 0, 100, 100], [200, 200, 300, 300]), np.array([1, 2]))
+    assert list(first) == [1, 2]
+    # 顺序调换且略有移动，id 跟随目标
+    second = tracker.update(boxes([205, 195, 305, 295], [10, 5, 110, 105]), np.array([2, 1]))
+    assert list(second) == [2, 1]
+
+
+def test_tracker_starts_new_tracks_for_other_classes_and_distant_boxes():
+    tracker = IoUTracker()
+    tracker.update(boxes([0, 0, 100, 100]), np.array([1]))
+    assert list(tracker.update(boxes([0, 0, 100, 100]), np.array([3]))) == [2]
+    assert list(tracker.update(boxes([500, 500, 600, 600]), np.array([3]))) == [3]
+
+
+def test_each_track_is_matched_at_most_once():
+    tracker = IoUTracker()
+    tracker.update(boxes([0, 0, 100, 100]), np.array([1]))
+    ids = tracker.update(boxes([0, 0, 100, 100], [5, 5, 105, 105]), np.array([1, 1]))
+    assert sorted(ids) == [1, 2]
+    assert ids[0] == 1
+
+
+def test_tracks_end_when_nothing_is_detected():
+    tracker = IoUTracker()
+    tracker.update(boxes([0, 0, 100, 100]), np.array([1]))
+    assert len(tracker.update(boxes(), np.array([], dtype=np.int32))) == 0
+    assert list(tracker.update(boxes([0, 0, 100, 100]), np.array([1]))) == [2]
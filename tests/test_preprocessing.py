@@ -0,0 +1,109 @@
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.models import object_detection_model as odm
+from backend.models.object_detection_model import (
+    ObjectDetectionModel, decode_yolo_output, fit_to_input, project_boxes
+)
+
+
+@pytest.fixture
+def make_model(monkeypatch):
+    # 预处理不需要网络，跳过权重加载
+    monkeypatch.setattr(odm, "create_backend", lambda *args, **kwargs: types.SimpleNamespace(supports_batching=True))
+    return ObjectDetectionModel
+
+
+def random_frame(width, height, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def letterbox_reference(frame, preprocessing):
+    """The letterboxed canvas built the obvious way, then normalized by blobFromImage."""
+    input_size = preprocessing["input_size"]
+    transform, resized_size = fit_to_input(frame.shape[1], frame.shape[0], input_size, letterbox=True)
+    pad_x, pad_y = transform[2:]
+    canvas = np.full((input_size[1], input_size[0], 3), preprocessing["pad_value"], dtype=np.uint8)
+    canvas[pad_y:pad_y + resized_size[1], pad_x:pad_x + resized_size[0]] = cv2.resize(frame, resized_size)
+    return cv2.dnn.blobFromImage(canvas, preprocessing["scale"], input_size, 0, swapRB=preprocessing["swap_rb"])
+
+
+def test_letterbox_preprocess_matches_blob_from_image(make_model):
+    model = make_model("YOLOv8")
+    frames = [random_frame(640, 480), random_frame(517, 333, seed=1), random_frame(200, 900, seed=2)]
+    blob, transforms = model.preprocess(frames)
+    assert blob.shape == (3, 3, 640, 640)
+    for frame, actual, transform in zip(frames, blob, transforms):
+        assert transform == fit_to_input(frame.shape[1], frame.shape[0], (640, 640), letterbox=True)[0]
+        np.testing.assert_allclose(actual, letterbox_reference(frame, model.preprocessing)[0], atol=1e-6)
+
+
+def test_stretch_preprocess_matches_blob_from_image(make_model):
+    model = make_model("SSD")
+    frame = random_frame(640, 480)
+    blob, _ = model.preprocess([frame])
+    reference = cv2.dnn.blobFromImage(frame, 0.007843, (300, 300), (127.5, 127.5, 127.5), swapRB=False)
+    np.testing.assert_allclose(blob, reference, atol=1e-5)
+
+
+def test_preprocess_reuses_buffers_across_sizes(make_model):
+    model = make_model("YOLOv8")
+    model.preprocess([random_frame(1280, 720, seed=3)])
+    frame = random_frame(300, 500, seed=4)
+    blob, _ = model.preprocess([frame])
+    # 上一帧较大的缩放结果不能残留在新帧的填充区域
+    np.testing.assert_allclose(blob[0], letterbox_reference(frame, model.preprocessing)[0], atol=1e-6)
+
+
+@pytest.mark.parametrize("size", [(640, 480), (517, 333), (200, 900), (1920, 1080)])
+@pytest.mark.parametrize("letterbox", [True, False])
+def test_project_boxes_round_trips(size, letterbox):
+    transform, _ = fit_to_input(*size, (640, 640), letterbox)
+    scale_x, scale_y, pad_x, pad_y = transform
+    boxes = np.array([[0, 0, size[0], size[1]], [10, 20, 110, 220], [size[0] - 7, 3, size[0], 9]], dtype=np.float32)
+    projected = boxes * np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32) \
+        + np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)
+    np.testing.assert_allclose(project_boxes(projected, transform), boxes, atol=1e-3)
+
+
+def yolo_rows(boxes, class_ids, transform, num_classes=80):
+    """(cx, cy, w, h, class scores...) rows for frame boxes, in network input pixels."""
+    scale_x, scale_y, pad_x, pad_y = transform
+    rows = np.zeros((len(boxes), 4 + num_classes), dtype=np.float32)
+    for row, (x1, y1, x2, y2), class_id in zip(rows, boxes, class_ids):
+        left, top = x1 * scale_x + pad_x, y1 * scale_y + pad_y
+        right, bottom = x2 * scale_x + pad_x, y2 * scale_y + pad_y
+        row[:4] = ((left + right) / 2, (top + bottom) / 2, right - left, bottom - top)
+        row[4 + class_id] = 0.9
+    return rows
+
+
+def test_decode_yolov8_output_projects_boxes_back_exactly():
+    transform, _ = fit_to_input(1280, 720, (640, 640), letterbox=True)
+    boxes = np.array([[100, 50, 400, 300], [800, 400, 1200, 700]])
+    rows = yolo_rows(boxes, [0, 2], transform)
+    # YOLOv8 导出形状为 (1, 84, 8400)，其余锚点为背景
+    output = np.zeros((1, 84, 8400), dtype=np.float32)
+    output[0, :, :len(rows)] = rows.T
+    decoded_boxes, confidences, class_ids = decode_yolo_output(output, transform, has_objectness=False)
+    order = np.argsort(class_ids)
+    np.testing.assert_array_equal(decoded_boxes[order], boxes)
+    np.testing.assert_array_equal(class_ids[order], [0, 2])
+    np.testing.assert_allclose(confidences, 0.9)
+
+
+def test_decode_yolov5_output_applies_objectness_and_nms():
+    transform, _ = fit_to_input(640, 480, (640, 640), letterbox=True)
+    boxes = np.array([[100, 100, 200, 200], [102, 101, 201, 199], [300, 300, 400, 400]])
+    rows = yolo_rows(boxes, [5, 5, 5], transform)
+    output = np.zeros((1, 25200, 85), dtype=np.float32)
+    output[0, :3, :4] = rows[:, :4]
+    output[0, :3, 5:] = rows[:, 4:]
+    output[0, :3, 4] = (1.0, 0.9, 1.0)
+    decoded_boxes, confidences, class_ids = decode_yolo_output(output, transform, has_objectness=True)
+    # 前两个框高度重叠，NMS 只保留置信度更高的一个
+    assert sorted(map(tuple, decoded_boxes.tolist())) == [(100, 100, 200, 200), (300, 300, 400, 400)]
+    np.testing.assert_array_equal(class_ids, [5, 5])
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+import pytest
+
+from backend.services import result_cache
+from backend.services.result_cache import ResultCache, perceptual_hash
+
+
+def make_value(n=1, width=640, height=480):
+    boxes = np.arange(n * 4, dtype=np.int32).reshape(n, 4)
+    return boxes, np.full(n, 0.5, np.float32), np.ones(n, np.int32), width, height
+
+
+def scene(seed=0, width=640, height=480):
+    """A smooth synthetic image, so the difference hash has stable gradients."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_make_key_depends_on_content_model_and_params():
+    key = ResultCache.make_key(b"image", "SSD", 0.5, 0.4)
+    assert key == ResultCache.make_key(b"image", "SSD", 0.5, 0.4)
+    assert key != ResultCache.make_key(b"image", "YOLOv8", 0.5, 0.4)
+    assert key != ResultCache.make_key(b"image", "SSD", 0.6, 0.4)
+    assert key != ResultCache.make_key(b"other", "SSD", 0.5, 0.4)
+    assert ResultCache.scope_of(key) == "SSD:0.5:0.4"
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", make_value())
+    cache.put("b", make_value())
+    assert cache.get("a") is not None
+    cache.put("c", make_value())
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.snapshot()["entries"] == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(ttl_seconds=10)
+    cache.put("a", make_value())
+    clock[0] += 9
+    assert cache.get("a") is not None
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_zero_ttl_never_expires(clock):
+    cache = ResultCache(ttl_seconds=0)
+    cache.put("a", make_value())
+    clock[0] += 10 ** 9
+    assert cache.get("a") is not None
+
+
+def test_perceptual_hash_survives_reencoding():
+    img = scene()
+    ok, jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    reencoded = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+    distance = bin(perceptual_hash(img) ^ perceptual_hash(reencoded)).count("1")
+    assert distance <= 4
+    assert bin(perceptual_hash(img) ^ perceptual_hash(scene(seed=1))).count("1") > 10
+    assert perceptual_hash(img) == perceptual_hash(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+
+def test_similar_frames_reuse_results_within_scope_and_size():
+    cache = ResultCache(phash_distance=6)
+    img = scene()
+    value = make_value()
+    key = ResultCache.make_key(b"first", "SSD", 0.5)
+    cache.put(key, value, perceptual_hash(img))
+
+    noisy = cv2.add(img, np.random.default_rng(2).integers(0, 3, img.shape, dtype=np.uint8))
+    phash = perceptual_hash(noisy)
+    assert cache.get_similar(ResultCache.make_key(b"second", "SSD", 0.5), phash, 640, 480) is value
+    # 不同模型或阈值、不同尺寸的帧都不能复用
+    assert cache.get_similar(ResultCache.make_key(b"second", "YOLOv8", 0.5), phash, 640, 480) is None
+    assert cache.get_similar(ResultCache.make_key(b"second", "SSD", 0.7), phash, 640, 480) is None
+    assert cache.get_similar(ResultCache.make_key(b"second", "SSD", 0.5), phash, 320, 240) is None
+    assert cache.get_similar(ResultCache.make_key(b"second", "SSD", 0.5), perceptual_hash(scene(seed=1)), 640, 480) is None
+    assert cache.stats["phash_hits"] == 1
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path, clock):
+    db_path = str(tmp_path / "cache.db")
+    value = make_value(3)
+    ResultCache(ttl_seconds=60, db_path=db_path).put("a", value)
+
+    cache = ResultCache(ttl_seconds=60, db_path=db_path)
+    assert cache.get("a") is None
+    boxes, confidences, class_ids, width, height = cache.get_from_disk("a")
+    np.testing.assert_array_equal(boxes, value[0])
+    np.testing.assert_array_equal(confidences, value[1])
+    np.testing.assert_array_equal(class_ids, value[2])
+    assert (width, height) == (640, 480)
+    # 从磁盘读出后进入内存层
+    assert cache.get("a") is not None
+
+    clock[0] += 61
+    assert ResultCache(ttl_seconds=60, db_path=db_path).get_from_disk("a") is None
+
+
+def test_snapshot_hit_rate():
+    cache = ResultCache()
+    cache.put("a", make_value())
+    cache.get("a")
+    cache.record_miss()
+    snapshot = cache.snapshot()
+    assert snapshot["hits"] == 1 and snapshot["misses"] == 1
+    assert snapshot["hit_rate"] == 0.5
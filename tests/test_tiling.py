@@ -0,0 +1,45 @@
+import numpy as np
+
+from backend.services.tiling import cut_by_tile_edge, merge_detections, tile_grid
+
+
+def test_tile_grid_covers_image_with_flush_last_tile():
+    tiles = tile_grid(1000, 600, 512, 0.25)
+    assert {(x, y) for x, y, _, _ in tiles} == {(0, 0), (384, 0), (488, 0), (0, 88), (384, 88), (488, 88)}
+    assert all(width == 512 and height == 512 for _, _, width, height in tiles)
+
+
+def test_small_image_is_a_single_tile():
+    assert tile_grid(300, 200, 512, 0.25) == [(0, 0, 300, 200)]
+
+
+def test_only_interior_tile_edges_count_as_cuts():
+    boxes = np.array([[0, 10, 50, 60], [100, 100, 512, 200], [200, 200, 300, 300]])
+    # 左上角的分块：左、上边是图像边界，右、下边与相邻分块相接
+    cut = cut_by_tile_edge(boxes, (0, 0, 512, 512), 1000, 1000)
+    np.testing.assert_array_equal(cut, [False, True, False])
+
+
+def test_merge_drops_cut_box_covered_by_whole_box():
+    boxes = np.array([
+        [100, 100, 300, 300],  # whole object from the neighbouring tile
+        [200, 100, 300, 300],  # same object cut by a tile edge: low IoU, but covered
+        [200, 100, 300, 300],  # same place, other class
+        [600, 600, 700, 700]
+    ])
+    confidences = np.array([0.6, 0.9, 0.8, 0.7], dtype=np.float32)
+    class_ids = np.array([1, 1, 2, 1])
+    cut = np.array([False, True, False, False])
+    keep = merge_detections(boxes, confidences, class_ids, cut, iou_threshold=0.45)
+    assert sorted(keep.tolist()) == [0, 2, 3]
+
+
+def test_merge_suppresses_overlapping_duplicates_by_confidence():
+    boxes = np.array([[10, 10, 110, 110], [12, 11, 111, 112]])
+    keep = merge_detections(boxes, np.array([0.5, 0.8]), np.array([0, 0]), np.zeros(2, dtype=bool), 0.45)
+    assert keep.tolist() == [1]
+
+
+def test_merge_of_nothing_is_empty():
+    keep = merge_detections(np.empty((0, 4)), np.empty(0), np.empty(0), np.empty(0, dtype=bool), 0.45)
+    assert keep.dtype == np.int64 and len(keep) == 0
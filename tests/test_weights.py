@@ -0,0 +1,41 @@
+import pytest
+
+from backend.models import object_detection_model as odm
+from backend.models.object_detection_model import weights_for
+
+
+@pytest.fixture
+def onnx_model(tmp_path, monkeypatch):
+    weights = tmp_path / "net.onnx"
+    weights.write_bytes(b"")
+    monkeypatch.setitem(odm.MODEL_SPECS, "Net", {
+        "family": "yolov8",
+        "weights": str(weights),
+        "config": None,
+        "variants": {"fp16": str(tmp_path / "net-fp16.onnx"), "int8": str(tmp_path / "net-int8.onnx")},
+        "class_names": ["object"]
+    })
+    return tmp_path
+
+
+def test_opencv_runs_fp16_from_the_fp32_file(onnx_model):
+    assert weights_for("Net", "fp16") == str(onnx_model / "net.onnx")
+
+
+def test_onnxruntime_needs_an_fp16_export(onnx_model):
+    # ONNX Runtime 按文件本身的精度运行，回退到 FP32 文件会让报告的精度与实际不符
+    with pytest.raises(FileNotFoundError):
+        weights_for("Net", "fp16", "onnxruntime")
+    (onnx_model / "net-fp16.onnx").write_bytes(b"")
+    assert weights_for("Net", "fp16", "onnxruntime") == str(onnx_model / "net-fp16.onnx")
+
+
+@pytest.mark.parametrize("backend", ["opencv", "onnxruntime"])
+def test_int8_needs_a_quantized_export(onnx_model, backend):
+    with pytest.raises(FileNotFoundError):
+        weights_for("Net", "int8", backend)
+
+
+def test_unknown_precision_is_rejected(onnx_model):
+    with pytest.raises(ValueError):
+        weights_for("Net", "bf16")